@@ -0,0 +1,164 @@
+import csv
+import time
+import argparse
+import resource
+import itertools
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import cv2
+from utils import bbox_iou
+
+PRECISIONS = {
+    'fp32': None,
+    'fp16': 'float16',
+    'bf16': 'bfloat16',
+}
+
+FIELDS = ['tracker', 'batch_size', 'resolution', 'threads', 'precision',
+          'fps', 'p50_ms', 'p95_ms', 'p99_ms', 'peak_rss_mb']
+
+
+def load_frames(replay, num_frames, resolution):
+    """frames of a recorded episode, or synthetic frames with a moving bright square
+
+    Returns:
+        (list): num_frames + 1 images, HxWxC, in BGR, the first one for init
+        (ndarray): (4,), init bbox
+    """
+    if replay is not None:
+        from replay import ReplayEnv
+        env = ReplayEnv(replay)
+        frames = [env.frame(t % env.num_frames) for t in range(num_frames + 1)]
+        frames = [cv2.resize(f, (resolution, resolution)) for f in frames]
+    else:
+        rng = np.random.RandomState(0)
+        frames = []
+        for t in range(num_frames + 1):
+            img = (rng.rand(resolution, resolution, 3) * 128).astype(np.uint8)
+            c = int(resolution / 2 + resolution / 8 * np.sin(t / 10))
+            img[c - resolution // 16:c + resolution // 16,
+                resolution // 2 - resolution // 16:resolution // 2 + resolution // 16] = 255
+            frames.append(img)
+    size = resolution * 36 / 224  # same ratio as test.py
+    init_bbox = np.array([(resolution - size) / 2, (resolution - size) / 2, size, size])
+    return frames, init_bbox
+
+
+def replay_frames(path, num_frames, resolution=224):
+    """at most num_frames + 1 frames of a recorded episode, without wrapping around"""
+    from replay import ReplayEnv
+    num_frames = min(num_frames, ReplayEnv(path).num_frames - 1)
+    return load_frames(path, num_frames, resolution)
+
+
+def track_sequence(tracker, frames, init_bbox):
+    """init the tracker on the first frame and track the others one by one
+
+    Returns:
+        (ndarray): (len(frames) - 1, 4), tracked bboxes
+        (ndarray): (len(frames) - 1,), latency (ms) of every `track`
+    """
+    tracker.init(frames[0], init_bbox)
+    bboxes, latencies = [], []
+    for frame in frames[1:]:
+        tic = time.perf_counter()
+        bboxes.append(tracker.track(frame))
+        latencies.append(time.perf_counter() - tic)
+    return np.array(bboxes), np.array(latencies) * 1000
+
+
+def compare_trackers(ref, test, frames, init_bbox):
+    """track the same frames with two trackers, e.g. a float one and a quantized one
+
+    Returns:
+        (dict): mean/min IoU and mean center error (pixel) of `test` against `ref`,
+            and the fps of both
+    """
+    ref_bboxes, ref_latencies = track_sequence(ref, frames, init_bbox)
+    test_bboxes, test_latencies = track_sequence(test, frames, init_bbox)
+    iou = bbox_iou(ref_bboxes, test_bboxes)
+    center_error = np.linalg.norm(
+        (ref_bboxes[:, :2] + ref_bboxes[:, 2:] / 2) - (test_bboxes[:, :2] + test_bboxes[:, 2:] / 2), axis=1)
+    return {
+        'frames': len(iou),
+        'mean_iou': float(iou.mean()),
+        'min_iou': float(iou.min()),
+        'mean_center_error': float(center_error.mean()),
+        'ref_fps': float(1000 / ref_latencies.mean()),
+        'test_fps': float(1000 / test_latencies.mean()),
+    }
+
+
+def run_config(tracker_name, model_path, batch_size, resolution, threads, precision,
+               replay, num_frames, warmup):
+    """benchmark one configuration, run in a fresh process so that the peak RSS
+    and thread settings do not leak between configurations
+    """
+    import torch
+    from trackers import TRACKERS
+    torch.set_num_threads(threads)
+    frames, init_bbox = load_frames(replay, num_frames, resolution)
+    tracker = TRACKERS[tracker_name](model_path)
+    device_type = 'cuda' if torch.cuda.is_available() else 'cpu'
+    dtype = PRECISIONS[precision]
+    autocast = torch.autocast(device_type, dtype=getattr(torch, dtype) if dtype else None,
+                              enabled=dtype is not None)
+
+    seq_ids = list(range(batch_size))
+    latencies = []
+    with autocast:
+        tracker.init_batch([frames[0]] * batch_size, [init_bbox] * batch_size, seq_ids)
+        for t in range(warmup):
+            tracker.track_batch([frames[1 + t % num_frames]] * batch_size, seq_ids)
+        for t in range(num_frames):
+            imgs = [frames[t + 1]] * batch_size
+            tic = time.perf_counter()
+            tracker.track_batch(imgs, seq_ids)
+            latencies.append(time.perf_counter() - tic)
+
+    latencies = np.array(latencies) * 1000
+    return {
+        'tracker': tracker_name,
+        'batch_size': batch_size,
+        'resolution': resolution,
+        'threads': threads,
+        'precision': precision,
+        'fps': batch_size * num_frames * 1000 / latencies.sum(),
+        'p50_ms': np.percentile(latencies, 50),
+        'p95_ms': np.percentile(latencies, 95),
+        'p99_ms': np.percentile(latencies, 99),
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', type=str, nargs='+', required=True, help='tracker=model_path, e.g. siamfc=./siamfc.pth')
+    parser.add_argument('--replay', type=str, default=None, help='recorded episode to feed, synthetic frames if not given')
+    parser.add_argument('--num_frames', type=int, default=200, help='tracked frames per configuration')
+    parser.add_argument('--warmup', type=int, default=10, help='untimed frames before measuring')
+    parser.add_argument('--batch_sizes', type=int, nargs='+', default=[1], help='sequences tracked in one track_batch call')
+    parser.add_argument('--resolutions', type=int, nargs='+', default=[224], help='input frame sizes')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1], help='torch CPU threads')
+    parser.add_argument('--precisions', type=str, nargs='+', default=['fp32'], choices=PRECISIONS.keys(), help='autocast precisions')
+    parser.add_argument('--output', type=str, default='./benchmark.csv', help='csv file of the results')
+    args = parser.parse_args()
+
+    models = dict(m.split('=', 1) for m in args.model)
+    results = []
+    ctx = mp.get_context('spawn')
+    for (tracker_name, model_path), batch_size, resolution, threads, precision in itertools.product(
+            models.items(), args.batch_sizes, args.resolutions, args.threads, args.precisions):
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as executor:
+            res = executor.submit(run_config, tracker_name, model_path, batch_size, resolution,
+                                  threads, precision, args.replay, args.num_frames, args.warmup).result()
+        results.append(res)
+        print('\t'.join(f'{k}={res[k]:.2f}' if isinstance(res[k], float) else f'{k}={res[k]}'
+                        for k in FIELDS))
+
+    with open(args.output, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(results)
+    print(f"Results are saved to {args.output}")
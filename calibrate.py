@@ -0,0 +1,45 @@
+import json
+import argparse
+import numpy as np
+import torch
+from trackers import TRACKERS
+from trackers.siamfc.quantize import quantize_tracker as quantize_siamfc
+from trackers.transt.quantize import quantize_tracker as quantize_transt
+from benchmark import replay_frames, compare_trackers
+
+QUANTIZERS = {
+    'siamfc': quantize_siamfc,
+    'transt': quantize_transt,
+}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tracker', type=str, default='siamfc', choices=QUANTIZERS.keys(), help='tracker to quantize')
+    parser.add_argument('--model_path', type=str, required=True, help='pretrained model path, the int8 model is saved to [model_path].int8.pt')
+    parser.add_argument('--calib_replay', type=str, required=True, help='recorded episode used for calibration')
+    parser.add_argument('--eval_replay', type=str, nargs='*', default=[], help='recorded episodes to compare the int8 tracker with the float one')
+    parser.add_argument('--num_frames', type=int, default=200, help='max frames used from every episode')
+    parser.add_argument('--threads', type=int, default=None, help='torch CPU threads')
+    parser.add_argument('--output', type=str, default=None, help='save the accuracy delta to this json file')
+    args = parser.parse_args()
+
+    if args.threads is not None:
+        torch.set_num_threads(args.threads)
+    frames, init_bbox = replay_frames(args.calib_replay, args.num_frames)
+    path = QUANTIZERS[args.tracker](args.model_path, frames, init_bbox)
+    print(f"Int8 model calibrated on {len(frames)} frames is saved to {path}")
+
+    results = {}
+    for replay in args.eval_replay:
+        frames, init_bbox = replay_frames(replay, args.num_frames)
+        ref = TRACKERS[args.tracker](args.model_path)
+        test = TRACKERS[args.tracker](args.model_path, int8=True)
+        results[replay] = compare_trackers(ref, test, frames, init_bbox)
+        print(replay + '\t' + '\t'.join(f'{k}={v:.3f}' if isinstance(v, float) else f'{k}={v}'
+                                        for k, v in results[replay].items()))
+    if results:
+        print(f"mean IoU against float: {np.mean([r['mean_iou'] for r in results.values()]):.3f}")
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
@@ -3,14 +3,30 @@ import gym_unrealcv
 from gym.spaces.box import Box
 import numpy as np
 import cv2
+import profiler
+from replay import RecordWrapper, ReplayEnv
 from torchvision.transforms.functional import to_tensor
 
-def create_env(env_id, seed=1):
-    env = gym.make(env_id)
+def create_env(env_id, seed=1, port=None, record=None, mock=False):
+    """mock: run against gym_unrealcv's MockScene instead of the unreal binary"""
+    kwargs = {}
+    if port is not None:
+        kwargs['port'] = port
+    if mock:
+        kwargs['mock'] = True
+    env = gym.make(env_id, **kwargs)
+    if record is not None:
+        env = RecordWrapper(env, record)
     env = ResizeWrapper(env, 224)
     env.seed(seed)
     return env
 
+def create_replay_env(path):
+    """replay an episode recorded by `create_env(..., record=path)`"""
+    env = ReplayEnv(path)
+    env = ResizeWrapper(env, 224)
+    return env
+
 class ResizeWrapper(gym.ObservationWrapper):
     def __init__(self, env, size):
         super(ResizeWrapper, self).__init__(env)
@@ -20,7 +36,8 @@ class ResizeWrapper(gym.ObservationWrapper):
     def observation(self, obs):
         """Return observation as opencv format, that is, in BGR and (H, W, C) 
         """        
-        img = cv2.resize(obs, (self.size, self.size))
+        with profiler.stage('resize'):
+            img = cv2.resize(obs, (self.size, self.size))
         return img
         
     def start(self):
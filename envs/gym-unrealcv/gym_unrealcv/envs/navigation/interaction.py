@@ -8,8 +8,9 @@ import distutils.version
 
 class Navigation(UnrealCv):
     def __init__(self, env, cam_id=0, port=9000,
-                 ip='127.0.0.1', targets=None, resolution=(160, 120)):
-        super(Navigation, self).__init__(env=env, port=port, ip=ip, cam_id=cam_id, resolution=resolution)
+                 ip='127.0.0.1', targets=None, resolution=(160, 120), request_config=None):
+        super(Navigation, self).__init__(env=env, port=port, ip=ip, cam_id=cam_id, resolution=resolution,
+                                         request_config=request_config)
 
         if targets == 'all':
             self.targets = self.get_objects()
@@ -88,19 +89,19 @@ class Navigation(UnrealCv):
     # snorlax
     def set_texture(self, target, picpath):
         cmd = 'vbp {target} set_mat {picpath}'
-        res = self.client.request(cmd.format(target=target, picpath=picpath))
+        res = self.request(cmd.format(target=target, picpath=picpath))
 
     def set_light(self, target, direction, intensity, color): # param num out of range
         cmd = 'vbp {target} set_light {row} {yaw} {pitch} {intensity} {r} {g} {b}'
         color = color/color.max()
-        res = self.client.request(cmd.format(target=target, row=direction[0], yaw=direction[1],
-                                             pitch=direction[2], intensity=intensity,
-                                             r=color[0], g=color[1], b=color[2]))
+        res = self.request(cmd.format(target=target, row=direction[0], yaw=direction[1],
+                                      pitch=direction[2], intensity=intensity,
+                                      r=color[0], g=color[1], b=color[2]))
 
     def set_skylight(self, target, color, intensity ): # param num out of range
         cmd = 'vbp {target} set_light {r} {g} {b} {intensity} '
-        res = self.client.request(cmd.format(target=target, intensity=intensity,
-                                             r=color[0], g=color[1], b=color[2]))
+        res = self.request(cmd.format(target=target, intensity=intensity,
+                                      r=color[0], g=color[1], b=color[2]))
 
     def get_pose(self,cam_id, type='hard'):  # pose = [x, y, z, roll, yaw, pitch]
         if type == 'soft':
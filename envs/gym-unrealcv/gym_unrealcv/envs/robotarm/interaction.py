@@ -6,7 +6,7 @@ import random
 import re
 class Robotarm(UnrealCv):
     def __init__(self, env, pose_range, cam_id=0, port=9000, targets=None,
-                 ip='127.0.0.1', resolution=(160, 120)):
+                 ip='127.0.0.1', resolution=(160, 120), request_config=None):
         self.arm = dict(
                 pose=np.zeros(5),
                 state=np.zeros(8),  # ground, left, left_in, right, right_in, body, reach
@@ -14,7 +14,8 @@ class Robotarm(UnrealCv):
                 high=np.array(pose_range['high']),
                 low=np.array(pose_range['low']),
         )
-        super(Robotarm, self).__init__(env=env, port=port, ip=ip, cam_id=cam_id, resolution=resolution)
+        super(Robotarm, self).__init__(env=env, port=port, ip=ip, cam_id=cam_id, resolution=resolution,
+                                       request_config=request_config)
 
         if targets == 'all':
             self.targets = self.get_objects()
@@ -44,8 +45,8 @@ class Robotarm(UnrealCv):
             cmd = 'vset /arm/RobotArmActor_1/moveto {M0} {M1} {M2} {M3} {grip}'
         elif mode == 'old':
             cmd = 'vbp armBP setpos {grip} {M3} {M2} {M1} {M0}'
-        return self.client.request(cmd.format(M0=pose[0], M1=pose[1], M2=pose[2],
-                                              M3=pose[3], grip=pose[4]))
+        return self.request(cmd.format(M0=pose[0], M1=pose[1], M2=pose[2],
+                                       M3=pose[3], grip=pose[4]))
 
     def move_arm(self, action, mode='old'):
         pose_tmp = self.arm['pose']+action
@@ -72,9 +73,7 @@ class Robotarm(UnrealCv):
             cmd = 'vbp armBP getpos'
         else:
             cmd = 'vget /arm/RobotArmActor_1/pose'
-        result = None
-        while result is None:
-            result = self.client.request(cmd)
+        result = self.request(cmd)
         result = result.split()
         if mode=='old':
             pose = []
@@ -88,9 +87,7 @@ class Robotarm(UnrealCv):
 
     def get_tip_pose(self):
         cmd = 'vget /arm/RobotArmActor_1/tip_pose'
-        result = None
-        while result is None:
-            result = self.client.request(cmd)
+        result = self.request(cmd)
         pose = np.array([float(i) for i in result.split()])
         pose[1] = -pose[1]
         self.arm['grip'] = pose[:3]
@@ -132,7 +129,7 @@ class Robotarm(UnrealCv):
     def check_collision(self, obj='RobotArmActor_1'):
         'cmd : vget /arm/RobotArmActor_1/query collision'
         cmd = 'vget /arm/{obj}/query collision'
-        res = self.client.request(cmd.format(obj=obj))
+        res = self.request(cmd.format(obj=obj))
         if res == 'true':
             return True
         else:
@@ -6,8 +6,9 @@ import time
 
 class Track(Navigation):
     def __init__(self, env, cam_id=0, port=9000,
-                 ip='127.0.0.1', resolution=(160, 120)):
-        super(Track, self).__init__(env=env, port=port, ip=ip, cam_id=cam_id, resolution=resolution)
+                 ip='127.0.0.1', resolution=(160, 120), request_config=None):
+        super(Track, self).__init__(env=env, port=port, ip=ip, cam_id=cam_id, resolution=resolution,
+                                    request_config=request_config)
         self.obstacles = []
 
     def random_texture(self, backgrounds, img_dirs, num=5):
@@ -37,23 +38,17 @@ class Track(Navigation):
     # functions for character setting
     def set_speed(self, target, speed):
         cmd = 'vbp {target} set_speed {speed}'
-        res = None
-        while res is None:
-            res = self.client.request(cmd.format(target=target, speed=speed))
+        res = self.request(cmd.format(target=target, speed=speed))
         return speed
 
     def set_acceleration(self, target, acc):
         cmd = 'vbp {target} set_acc {acc}'
-        res = None
-        while res is None:
-            res = self.client.request(cmd.format(target=target, acc=acc))
+        res = self.request(cmd.format(target=target, acc=acc))
         return acc
 
     def set_maxdis2goal(self, target, dis):
         cmd = 'vbp {target} set_maxrange {dis}'
-        res = None
-        while res is None:
-            res = self.client.request(cmd.format(target=target, dis=dis))
+        res = self.request(cmd.format(target=target, dis=dis))
         return dis
 
     def set_appearance(self, target, id, spline=False):
@@ -61,16 +56,12 @@ class Track(Navigation):
             cmd = 'vbp {target} set_app {id}'
         else:
             cmd = 'vbp {target} set_mixamoapp {id}'
-        res = None
-        while res is None:
-            res = self.client.request(cmd.format(target=target, id=id))
+        res = self.request(cmd.format(target=target, id=id))
         return id
 
     def start_walking(self, target):
         cmd = 'vbp {target} start'
-        res = None
-        while res is None:
-            res = self.client.request(cmd.format(target=target))
+        res = self.request(cmd.format(target=target))
         if 'true' in res:
             return True
         if 'false' in res:
@@ -132,15 +123,11 @@ class Track(Navigation):
 
     def reset_target(self, target):
         cmd = 'vbp {target} reset'
-        res=None
-        while res is None:
-            res = self.client.request(cmd.format(target=target))
+        res = self.request(cmd.format(target=target))
 
     def set_phy(self, obj, state):
         cmd = 'vbp {target} set_phy {state}'
-        res=None
-        while res is None:
-            res = self.client.request(cmd.format(target=obj, state =state))
+        res = self.request(cmd.format(target=obj, state =state))
 
     def simulate_physics(self, objects):
         for obj in objects:
@@ -148,18 +135,14 @@ class Track(Navigation):
 
     def set_move(self, target, angle, velocity):
         cmd = 'vbp {target} set_move {angle} {velocity}'.format(target=target, angle=angle, velocity=velocity)
-        res = None
-        while res is None:
-            res = self.client.request(cmd)
+        res = self.request(cmd)
 
     def set_move_batch(self, objs_list, action_list):
         cmd = 'vbp {obj} set_move {angle} {velocity}'
         cmd_list = []
         for i in range(len(objs_list)):
             cmd_list.append(cmd.format(obj=objs_list[i], angle=action_list[i][1], velocity=action_list[i][0]))
-        res = None
-        while res is None:
-            res = self.client.request(cmd_list)
+        res = self.request(cmd_list)
 
     def set_move_with_cam_batch(self, objs_list, action_list, cam_ids, cam_rots):
         cmd_move = 'vbp {obj} set_move {angle} {velocity}'
@@ -170,17 +153,13 @@ class Track(Navigation):
         for i in range(len(cam_ids)):
             rot = cam_rots[i]
             cam_id = cam_ids[i]
-            self.client.request(cmd_rot_cam.format(cam_id=cam_id, roll=rot[0], yaw=rot[1], pitch=rot[2]))
+            self.request(cmd_rot_cam.format(cam_id=cam_id, roll=rot[0], yaw=rot[1], pitch=rot[2]))
             self.cam[cam_id]['rotation'] = rot
-        res = None
-        while res is None:
-            res = self.client.request(cmd_list)
+        res = self.request(cmd_list)
 
     def get_hit(self, target):
         cmd = 'vbp {target} get_hit'.format(target=target)
-        res = None
-        while res is None:
-            res = self.client.request(cmd)
+        res = self.request(cmd)
         if 'true' in res:
             return True
         if 'false' in res:
@@ -202,18 +181,14 @@ class Track(Navigation):
 
     def set_random(self, target, value=1):
         cmd = 'vbp {target} set_random {value}'.format(target=target, value=value)
-        res=None
-        while res is None:
-            res = self.client.request(cmd)
+        res = self.request(cmd)
 
     def set_interval(self, interval, target=None):
         if target is None:
             cmd = 'vbp set_interval {value}'.format(value=interval)
         else:
             cmd = 'vbp {target} set_interval {value}'.format(target=target, value=interval)
-        res = None
-        while res is None:
-            res = self.client.request(cmd)
+        res = self.request(cmd)
 
     def init_objects(self, objects):
         self.objects_dict = dict()
@@ -224,9 +199,7 @@ class Track(Navigation):
 
     def set_obj_scale(self, obj, scale):
         cmd = 'vbp {obj} set_scale {x} {y} {z}'.format(obj=obj, x=scale[0], y=scale[1], z=scale[2])
-        res = None
-        while res is None:
-            res = self.client.request(cmd)
+        res = self.request(cmd)
 
     def random_obstacles(self, objects, img_dirs, num, area, start_area, texture=False):
         sample_index = np.random.choice(len(objects), num, replace=False)
@@ -260,16 +233,12 @@ class Track(Navigation):
                'vset /object/{0}/rotation {1} {2} {3}'.format(obj_name, rot[0], rot[1], rot[2]),
                'vbp {0} set_phy 1'.format(obj_name)
                ]
-        res = None
-        while res is None:
-            res = self.client.request(cmd)
+        res = self.request(cmd)
         return obj_name
 
     def move_goal(self, obj, goal):
         cmd = 'vbp {obj} move_to_goal {x} {y}'.format(obj=obj, x=goal[0] , y=goal[1])
-        res = None
-        while res is None:
-            res = self.client.request(cmd)
+        res = self.request(cmd)
 
     def get_pose_img_batch(self, objs_list, cam_ids, obs_type='lit', mode='fast', cam_rot=False):
         cmd_img = 'vget /camera/{cam_id}/{viewmode} bmp'
@@ -299,9 +268,7 @@ class Track(Navigation):
             for cam_id in cam_ids:
                 cmd_list.append(cmd_cam_loc.format(cam_id=cam_id))
                 cmd_list.append(cmd_cam_rot.format(cam_id=cam_id))
-        res_list = None
-        while res_list is None:
-            res_list = self.client.request(cmd_list)
+        res_list = self.request(cmd_list)
         pose_list = []
         img_list = []
         depth_list = []
@@ -313,13 +280,11 @@ class Track(Navigation):
         start_point = len(objs_list)*2
         for i in range(len(cam_ids)):
             p = int(start_point+i*(1+use_depth))
-            image = self.decode_bmp(res_list[p])[:, :, :-1]
+            image = self.decode_image(res_list[p], 'fast')
             img_list.append(image)
             if use_depth:
-                depth = np.fromstring(res_list[p+1], np.float32)
-                depth = depth[-self.resolution[1] * self.resolution[0]:]
-                depth = depth.reshape(self.resolution[1], self.resolution[0], 1)
-                depth = 200/depth
+                depth = self.decode_depth(res_list[p+1], inverse=False)
+                depth = np.divide(200, depth, out=depth)
                 depth_list.append(depth)
         start_point = int(len(objs_list)*2+len(cam_ids)*(1+use_depth))
         if cam_rot:
@@ -339,17 +304,10 @@ class Track(Navigation):
         cmd_depth = 'vget /camera/{cam_id}/depth npy'
         for cam_id in cam_ids:
             cmd_list.append(cmd_depth.format(cam_id=cam_id))
-        res_list = None
-        while res_list is None:
-            res_list = self.client.request(cmd_list)
+        res_list = self.request(cmd_list)
         depth_list = []
         for res in res_list:
-            depth = np.fromstring(res, np.float32)
-            depth = depth[-self.resolution[1] * self.resolution[0]:]
-            depth = depth.reshape(self.resolution[1], self.resolution[0], 1)
-            if inverse:
-                depth = 1/depth
-            depth_list.append(depth)
+            depth_list.append(self.decode_depth(res, inverse))
         return depth_list
 
     def set_cam(self, obj, loc=[0, 30, 70], rot=[0, 0, 0]):
@@ -357,7 +315,5 @@ class Track(Navigation):
         x, y, z = loc
         row, pitch, yaw = rot
         cmd = 'vbp {0} set_cam {1} {2} {3} {4} {5} {6}'.format(obj, x, y, z, row, pitch, yaw)
-        res = None
-        while res is None:
-            res = self.client.request(cmd)
+        res = self.request(cmd)
         return res
@@ -3,7 +3,7 @@ import gym
 import numpy as np
 from gym import spaces
 from gym_unrealcv.envs.tracking import reward
-from gym_unrealcv.envs.utils import env_unreal, misc
+from gym_unrealcv.envs.utils import env_unreal, misc, mock_unreal
 from gym_unrealcv.envs.tracking.interaction import Tracking
 
 ''' 
@@ -25,7 +25,9 @@ class UnrealCvGeometry(gym.Env):
                  observation_type='Color',  # 'color', 'depth', 'rgbd'
                  reward_type='distance',  # distance
                  docker=False,
-                 resolution=(640, 480)
+                 resolution=(640, 480),
+                 port=None,
+                 mock=False  # serve a MockScene instead of running the unreal binary
                  ):
         self.docker = docker
         self.reset_type = reset_type
@@ -55,16 +57,23 @@ class UnrealCvGeometry(gym.Env):
         self.texture_interval = setting['texture_interval']
         self.texture_cnt = 0
 
-        self.textures_list = misc.get_textures(setting['imgs_dir'], self.docker)
+        if mock:
+            self.textures_list = ['mock']  # MockScene only derives a color from the texture path
+        else:
+            self.textures_list = misc.get_textures(setting['imgs_dir'], self.docker)
         # print(self.textures_list)
 
         # start unreal env
-        self.unreal = env_unreal.RunUnreal(ENV_BIN=setting['env_bin'])
-        env_ip, env_port = self.unreal.start(docker, resolution)
+        if mock:
+            self.unreal = mock_unreal.RunMockUnreal()
+        else:
+            self.unreal = env_unreal.RunUnreal(ENV_BIN=setting['env_bin'])
+        env_ip, env_port = self.unreal.start(docker, resolution, port)
 
         # connect UnrealCV
         self.unrealcv = Tracking(cam_id=self.cam_id, port=env_port, ip=env_ip,
-                                 env=self.unreal.path2env, resolution=resolution)
+                                 env=self.unreal.path2env, resolution=resolution,
+                                 request_config=setting.get('request_config'))
 
         # define action
         self.action_type = action_type
@@ -113,32 +122,34 @@ class UnrealCvGeometry(gym.Env):
             Depth=None,
         )
         
+        # commands of a step are sent in one exchange, see CommandBatch
+        batch = self.unrealcv.batch()
         if action is not None:
-            # perform offered action
-            _, cur_yaw, cur_pitch = self.unrealcv.get_rotation(self.cam_id)
+            # perform offered action, the camera rotation was read at the end of the last step
+            _, cur_yaw, cur_pitch = self.unrealcv.get_rotation(self.cam_id, 'soft')
             # act_yaw, act_pitch = self.discrete_actions[action]
             # self.unrealcv.set_rotation(self.cam_id, [0, cur_yaw + act_yaw, cur_pitch + act_pitch])
-            self.unrealcv.set_rotation(self.cam_id, [0, cur_yaw + action[0], cur_pitch + action[1]])
-            # get image
-            state = self.unrealcv.get_observation(self.cam_id, self.observation_type, 'fast')
+            batch.set_rotation(self.cam_id, [0, cur_yaw + action[0], cur_pitch + action[1]])
             # state = [img, [0., 0.]]
         else:
             # get target location
-            target_pos = self.unrealcv.get_obj_location(self.target_list[0])
-            camera_pos = self.unrealcv.get_location(self.cam_id)
-            _, cur_yaw, cur_pitch = self.unrealcv.get_rotation(self.cam_id)
+            target_pos, camera_pos, (_, cur_yaw, cur_pitch) = self.unrealcv.batch().get_obj_location(
+                self.target_list[0]).get_location(self.cam_id).get_rotation(self.cam_id).send()
             # abs camera rotation
             abs_yaw = 90 - np.arctan((target_pos[0]-camera_pos[0]) / (target_pos[1]-camera_pos[1])) / np.pi * 180
             xy = ((target_pos[0]-camera_pos[0])**2 + (target_pos[1]-camera_pos[1])**2)**0.5
             abs_pitch = np.arctan((target_pos[2] - camera_pos[2]) / xy) / np.pi * 180
             # perform abs action
-            self.unrealcv.set_rotation(self.cam_id, [0, abs_yaw, abs_pitch])
+            batch.set_rotation(self.cam_id, [0, abs_yaw, abs_pitch])
             # calculate gt action
             gt_delta_yaw = abs_yaw - cur_yaw
             gt_delta_pitch = abs_pitch - cur_pitch
-            # get image
-            state = self.unrealcv.get_observation(self.cam_id, self.observation_type, 'fast')
             # state = [img, [gt_delta_yaw, gt_delta_pitch]]
+        # get image, and the poses for reward
+        batch.get_observation(self.cam_id, self.observation_type, 'fast')
+        batch.get_pose(self.cam_id)
+        batch.get_obj_pose(self.target_list[0])
+        _, state, info['Pose'], self.target_pos = batch.send()
 
         self.count_steps += 1                                         
 
@@ -152,8 +163,6 @@ class UnrealCvGeometry(gym.Env):
             #                             10, self.reset_area, self.start_area, texture=True)
         
         # calculate reward
-        info['Pose'] = self.unrealcv.get_pose(self.cam_id)
-        self.target_pos = self.unrealcv.get_obj_pose(self.target_list[0])
         info['Direction'] = misc.get_direction(info['Pose'], self.target_pos)   # [-180, 180]
         direction_error = abs(info['Direction']) / (self.max_direction / 2)
         info['Reward'] = 1 - direction_error / (360 / self.max_direction)   # [0, 1]
@@ -171,22 +180,21 @@ class UnrealCvGeometry(gym.Env):
         if self.count_steps >= self.max_steps:
             info['Done'] = True
 
-        return state, np.float(info['Reward']), info['Done'], info
+        return state, float(info['Reward']), info['Done'], info
 
     def reset(self):
         # self.C_reward = 0
         self.count_close = 0
 
-        self.unrealcv.set_obj_location(self.target_list[0], self.safe_start[0])
-
         # set camera loaction and rotation, location
         cam_pos_exp = [0, -890, 700]
-        self.unrealcv.set_location(self.cam_id, cam_pos_exp)
+        self.unrealcv.batch().set_obj_location(self.target_list[0], self.safe_start[0]).set_location(
+            self.cam_id, cam_pos_exp).send()
         time.sleep(0.5)
 
         # get target location
-        target_pos = self.unrealcv.get_obj_location(self.target_list[0])
-        camera_pos = self.unrealcv.get_location(self.cam_id)
+        target_pos, camera_pos = self.unrealcv.batch().get_obj_location(self.target_list[0]).get_location(
+            self.cam_id).send()
         # abs camera rotation
         abs_yaw = 90 - np.arctan((target_pos[0]-camera_pos[0]) / (target_pos[1]-camera_pos[1])) / np.pi * 180
         xy = ((target_pos[0]-camera_pos[0])**2 + (target_pos[1]-camera_pos[1])**2)**0.5
@@ -200,7 +208,9 @@ class UnrealCvGeometry(gym.Env):
 
         # get observation
         time.sleep(0.5)
-        state = self.unrealcv.get_observation(self.cam_id, self.observation_type, 'fast')
+        # the rotation read back is used by the next step
+        state, _ = self.unrealcv.batch().get_observation(self.cam_id, self.observation_type, 'fast').get_rotation(
+            self.cam_id).send()
 
         # save trajectory
         self.trajectory = []
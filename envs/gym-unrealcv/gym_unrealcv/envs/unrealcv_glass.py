@@ -64,7 +64,8 @@ class UnrealCvGlass(gym.Env):
                                    ip=env_ip,
                                 #    targets=self.target_list,
                                    env=self.unreal.path2env,
-                                   resolution=resolution)
+                                   resolution=resolution,
+                                   request_config=setting.get('request_config'))
         self.unrealcv.pitch = self.pitch
 
         #  define action
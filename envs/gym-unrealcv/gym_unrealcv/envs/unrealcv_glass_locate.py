@@ -96,7 +96,8 @@ class UnrealCvGlassLocate(gym.Env):
                                    ip=env_ip,
                                 #    targets=self.target_list,
                                    env=self.unreal.path2env,
-                                   resolution=resolution)
+                                   resolution=resolution,
+                                   request_config=setting.get('request_config'))
         self.unrealcv.pitch = self.pitch
 
         #  define action
@@ -57,7 +57,8 @@ class UnrealCvTrack(gym.Env):
 
         # connect UnrealCV
         self.unrealcv = Tracking(cam_id=self.cam_id, port=env_port, ip=env_ip,
-                                 env=self.unreal.path2env, resolution=resolution)
+                                 env=self.unreal.path2env, resolution=resolution,
+                                 request_config=setting.get('request_config'))
 
         # define action
         self.action_type = action_type
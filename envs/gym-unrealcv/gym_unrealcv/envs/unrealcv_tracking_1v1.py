@@ -60,7 +60,8 @@ class UnrealCvTracking_1v1(gym.Env):
 
         # connect UnrealCV
         self.unrealcv = Tracking(cam_id=self.cam_id[0], port=env_port, ip=env_ip,
-                                 env=self.unreal.path2env, resolution=resolution)
+                                 env=self.unreal.path2env, resolution=resolution,
+                                 request_config=setting.get('request_config'))
 
         # define action
         self.action_type = action_type
@@ -18,9 +18,12 @@ class RunUnreal():
         assert os.path.exists(self.path2binary), \
             'Please load env binary in UnrealEnv and Check the env_bin in setting file!'
 
-    def start(self, docker, resolution=(160, 160)):
+    def start(self, docker, resolution=(160, 160), port=None):
         # check binary exist
-        port = self.read_port()
+        if port is None:
+            port = self.read_port()
+        elif port != self.read_port():
+            self.write_port(port)
         self.write_resolution(resolution)
         self.use_docker = docker
         if self.use_docker:
@@ -0,0 +1,384 @@
+import argparse
+import io
+import math
+import os
+import re
+import socket
+import socketserver
+import struct
+import tempfile
+import threading
+import zlib
+import cv2
+import numpy as np
+
+# local stand-in of an Unreal binary running the UnrealCV server, to run UnrealCv, the
+# interactions and the gym envs end to end without the UE4 binary or a GPU, e.g.
+#   python -m gym_unrealcv.envs.utils.mock_unreal --port 9000 --resolution 640 480
+
+MAGIC = 0x9E2B83C1
+_HEADER = struct.Struct('<II')
+
+
+class MockScene(object):
+    """Kinematic scene answering UnrealCV commands.
+
+    Cameras and objects only have poses, objects are drawn as boxes of their color over a
+    sky and a floor, shaded by the lights. Objects are created when a command first names
+    them. Moving objects (`vbp {obj} start_move`) walk between random waypoints of `area`,
+    or in the direction given by `vbp {obj} set_move`, `dt` seconds for every lit image
+    rendered. Blueprint calls without an effect here reply '{}'.
+    """
+    def __init__(self, resolution=(640, 480), fov=90, area=(-800, 800, -800, 800), dt=0.1, seed=0,
+                 file_dir=None):
+        self.resolution = resolution
+        self.fov = fov
+        self.area = area  # x_min, x_max, y_min, y_max of the waypoints
+        self.dt = dt
+        self.rng = np.random.RandomState(seed)
+        self.file_dir = file_dir or tempfile.gettempdir()  # images of the file mode
+        self.cameras = dict()
+        self.objects = dict()
+        self.lights = dict()  # name: intensity
+        self.sky = np.array([200, 160, 120], np.float32)  # BGR
+        self.floor = np.array([90, 110, 100], np.float32)
+        self.handlers = [(re.compile(pattern), handler) for pattern, handler in [
+            (r'vget /camera/(\d+)/location$', self.get_camera_location),
+            (r'vset /camera/(\d+)/(?:location|moveto) (\S+) (\S+) (\S+)$', self.set_camera_location),
+            (r'vget /camera/(\d+)/rotation$', self.get_camera_rotation),
+            (r'vset /camera/(\d+)/rotation (\S+) (\S+) (\S+)$', self.set_camera_rotation),
+            (r'vget /camera/(\d+)/pose$', self.get_camera_pose),
+            (r'vset /camera/(\d+)/pose (\S+) (\S+) (\S+) (\S+) (\S+) (\S+)$', self.set_camera_pose),
+            (r'vset /camera/(\d+)/horizontal_fieldofview (\S+)$', self.set_fov),
+            (r'vget /camera/(\d+)/depth npy$', self.get_depth),
+            (r'vget /camera/(\d+)/(lit|object_mask|normal) (\S+)$', self.get_image),
+            (r'vget /objects$', self.get_objects),
+            (r'vset /objects/spawn (\S+) (\S+)$', self.spawn),
+            (r'vget /object/([^/\s]+)/location$', self.get_object_location),
+            (r'vset /object/([^/\s]+)/location (\S+) (\S+) (\S+)$', self.set_object_location),
+            (r'vget /object/([^/\s]+)/rotation$', self.get_object_rotation),
+            (r'vset /object/([^/\s]+)/rotation (\S+) (\S+) (\S+)$', self.set_object_rotation),
+            (r'vget /object/([^/\s]+)/color$', self.get_object_color),
+            (r'vset /object/([^/\s]+)/color (\S+) (\S+) (\S+)$', self.set_object_color),
+            (r'vset /object/([^/\s]+)/(show|hide|destroy)$', self.set_object_visibility),
+            (r'vbp (\S+) (\S+)(.*)$', self.blueprint),
+            (r'(?:vrun |vset /action/|DisableAllScreenMessages)', lambda *args: 'ok'),
+        ]]
+
+    def handle(self, cmd):
+        """reply to a command, str for text and bytes for images"""
+        for pattern, handler in self.handlers:
+            match = pattern.match(cmd)
+            if match is not None:
+                return handler(*match.groups())
+        return 'error Can not find a handler for this request'
+
+    # cameras, the rotation is [pitch, yaw, roll] as in the commands
+    def camera(self, cam_id):
+        return self.cameras.setdefault(int(cam_id), dict(location=[0., 0., 0.], rotation=[0., 0., 0.]))
+
+    def get_camera_location(self, cam_id):
+        return _format(self.camera(cam_id)['location'])
+
+    def set_camera_location(self, cam_id, *loc):
+        self.camera(cam_id)['location'] = [float(i) for i in loc]
+        return 'ok'
+
+    def get_camera_rotation(self, cam_id):
+        return _format(self.camera(cam_id)['rotation'])
+
+    def set_camera_rotation(self, cam_id, *rot):
+        self.camera(cam_id)['rotation'] = [float(i) for i in rot]
+        return 'ok'
+
+    def get_camera_pose(self, cam_id):
+        camera = self.camera(cam_id)
+        return _format(camera['location'] + camera['rotation'])
+
+    def set_camera_pose(self, cam_id, *pose):
+        self.set_camera_location(cam_id, *pose[:3])
+        return self.set_camera_rotation(cam_id, *pose[3:])
+
+    def set_fov(self, cam_id, fov):
+        self.fov = float(fov)
+        return 'ok'
+
+    # objects
+    def object(self, name):
+        if name not in self.objects:
+            self.objects[name] = dict(
+                location=[0., 0., 0.], rotation=[0., 0., 0.], size=[60., 60., 180.],
+                color=[int(i) for i in self.rng.randint(32, 256, 3)],  # RGB
+                visible=True, moving=False, speed=100., goal=None)
+        return self.objects[name]
+
+    def get_objects(self):
+        return ' '.join(self.objects)
+
+    def spawn(self, obj_type, name):
+        self.object(name)
+        return 'ok'
+
+    def get_object_location(self, name):
+        return _format(self.object(name)['location'])
+
+    def set_object_location(self, name, *loc):
+        self.object(name)['location'] = [float(i) for i in loc]
+        return 'ok'
+
+    def get_object_rotation(self, name):
+        return _format(self.object(name)['rotation'])
+
+    def set_object_rotation(self, name, *rot):
+        self.object(name)['rotation'] = [float(i) for i in rot]
+        return 'ok'
+
+    def get_object_color(self, name):
+        return '(R={},G={},B={},A=255)'.format(*self.object(name)['color'])
+
+    def set_object_color(self, name, *color):
+        self.object(name)['color'] = [int(float(i)) for i in color]
+        return 'ok'
+
+    def set_object_visibility(self, name, action):
+        if action == 'destroy':
+            self.objects.pop(name, None)
+        else:
+            self.object(name)['visible'] = action == 'show'
+        return 'ok'
+
+    def blueprint(self, target, func, args):
+        args = args.split()
+        if func in ('start_move', 'start'):
+            self.object(target).update(moving=True, goal=self.waypoint())
+        elif func == 'stop_move':
+            self.object(target)['moving'] = False
+        elif func == 'set_speed':
+            self.object(target)['speed'] = float(args[0])
+        elif func == 'set_move':  # angle, velocity
+            obj = self.object(target)
+            obj['rotation'][1] += float(args[0])
+            obj.update(moving=True, speed=float(args[1]), goal=None)
+        elif func == 'move_to_goal':
+            self.object(target).update(moving=True, goal=[float(args[0]), float(args[1])])
+        elif func == 'random_light':
+            self.lights[target] = self.rng.uniform(0.6, 1.2)
+        elif func == 'set_mat':
+            # only a color is derived from the texture path
+            color = np.array([zlib.crc32(' '.join(args).encode()) >> s & 0xff for s in (0, 8, 16)], np.float32)
+            if 'floor' in target.lower():
+                self.floor = color
+            else:
+                self.sky = color
+        elif func == 'get_hit':
+            return '{"Hit": "false"}'
+        return '{}'
+
+    def step(self):
+        """move the moving objects for dt seconds"""
+        x_min, x_max, y_min, y_max = self.area
+        for obj in self.objects.values():
+            if not obj['moving']:
+                continue
+            loc = obj['location']
+            if obj['goal'] is not None:
+                dx, dy = obj['goal'][0] - loc[0], obj['goal'][1] - loc[1]
+                dist = math.hypot(dx, dy)
+                if dist < obj['speed'] * self.dt:
+                    obj['goal'] = self.waypoint()
+                    continue
+                obj['rotation'][1] = math.degrees(math.atan2(dy, dx))
+            yaw = math.radians(obj['rotation'][1])
+            loc[0] = min(max(loc[0] + obj['speed'] * self.dt * math.cos(yaw), x_min), x_max)
+            loc[1] = min(max(loc[1] + obj['speed'] * self.dt * math.sin(yaw), y_min), y_max)
+
+    def waypoint(self):
+        x_min, x_max, y_min, y_max = self.area
+        return [self.rng.uniform(x_min, x_max), self.rng.uniform(y_min, y_max)]
+
+    # rendering
+    def get_image(self, cam_id, viewmode, fmt):
+        if viewmode == 'lit':
+            self.step()
+        width, height = self.resolution
+        if fmt == 'bmp':
+            # 32 bit top-down BMP, the pixels are drawn in place after the header. The reserved
+            # field is not valid utf-8, so that clients keep the reply as bytes
+            reply = bytearray(54 + width * height * 4)
+            struct.pack_into('<2sI4sIIiiHHIIiiII', reply, 0, b'BM', len(reply), b'\xff' * 4, 54,
+                             40, width, -height, 1, 32, 0, width * height * 4, 2835, 2835, 0, 0)
+            self.render(cam_id, viewmode, np.frombuffer(reply, np.uint8, offset=54).reshape(height, width, 4))
+            return bytes(reply)
+        image = np.empty((height, width, 4), np.uint8)
+        self.render(cam_id, viewmode, image)
+        if fmt == 'png':
+            return cv2.imencode('.png', image[:, :, :3])[1].tobytes()
+        # file mode, fmt is the file name
+        path = os.path.join(self.file_dir, os.path.basename(fmt))
+        cv2.imwrite(path, image[:, :, :3])
+        return path
+
+    def get_depth(self, cam_id):
+        depth, boxes = self.floor_depth(cam_id), self.boxes(cam_id)
+        for (x0, y0, x1, y1), distance, _ in boxes:
+            depth[y0:y1, x0:x1] = distance
+        buf = io.BytesIO()
+        np.save(buf, depth)
+        return buf.getvalue()
+
+    def render(self, cam_id, viewmode, out):
+        """draw the view of a camera into a HxWx4 BGRA array"""
+        if viewmode == 'object_mask':
+            out[:] = 0
+        else:
+            light = np.mean(list(self.lights.values())) if self.lights else 1.0
+            horizon = self.horizon(cam_id)
+            out[:horizon, :, :3] = np.clip(self.sky * light, 0, 255)
+            out[horizon:, :, :3] = np.clip(self.floor * light, 0, 255)
+            out[:, :, 3] = 255
+        for (x0, y0, x1, y1), _, color in self.boxes(cam_id):
+            out[y0:y1, x0:x1, :3] = color[::-1]
+            if viewmode != 'object_mask':
+                out[y0:y0 + (y1 - y0) // 5, x0:x1, :3] = color[::-1] // 2  # a darker head
+
+    def boxes(self, cam_id):
+        """(x0, y0, x1, y1) image box, distance and color of every visible object, far to near"""
+        camera = self.camera(cam_id)
+        width, height = self.resolution
+        focal = width / 2 / math.tan(math.radians(self.fov) / 2)
+        pitch, yaw = math.radians(camera['rotation'][0]), math.radians(camera['rotation'][1])
+        forward = np.array([math.cos(pitch) * math.cos(yaw), math.cos(pitch) * math.sin(yaw), math.sin(pitch)])
+        right = np.array([-math.sin(yaw), math.cos(yaw), 0])
+        up = np.cross(right, forward)
+        boxes = []
+        for obj in self.objects.values():
+            offset = np.array(obj['location']) - camera['location']
+            distance = offset.dot(forward)
+            if not obj['visible'] or distance < 1:
+                continue
+            u = width / 2 + focal * offset.dot(right) / distance
+            v = height / 2 - focal * offset.dot(up) / distance
+            w = focal * obj['size'][0] / distance / 2
+            h = focal * obj['size'][2] / distance / 2
+            x0, x1 = int(max(u - w, 0)), int(min(u + w, width))
+            y0, y1 = int(max(v - h, 0)), int(min(v + h, height))
+            if x0 < x1 and y0 < y1:
+                boxes.append(((x0, y0, x1, y1), distance, np.array(obj['color'], np.uint8)))
+        boxes.sort(key=lambda box: -box[1])
+        return boxes
+
+    def horizon(self, cam_id):
+        width, height = self.resolution
+        focal = width / 2 / math.tan(math.radians(self.fov) / 2)
+        pitch = math.radians(self.camera(cam_id)['rotation'][0])
+        return int(min(max(height / 2 + focal * math.tan(pitch), 0), height))
+
+    def floor_depth(self, cam_id, far=10000.):
+        # distance along the ray to the floor (z = 0) of every row, far for the sky
+        width, height = self.resolution
+        focal = width / 2 / math.tan(math.radians(self.fov) / 2)
+        camera = self.camera(cam_id)
+        elevation = math.radians(camera['rotation'][0]) + np.arctan((height / 2 - np.arange(height)) / focal)
+        with np.errstate(divide='ignore'):
+            rows = np.where(elevation < 0, camera['location'][2] / np.sin(-elevation), far)
+        depth = np.empty((height, width), np.float32)
+        depth[:] = np.minimum(rows, far)[:, None]
+        return depth
+
+
+class MockUnrealServer(socketserver.ThreadingTCPServer):
+    """UnrealCV server of a `MockScene`, speaking the UnrealCV wire protocol: every message is
+    framed as magic, payload size (uint32 each) and payload "{id}:{message}". Like the real
+    server, each client is greeted with "connected to {project}" and requests are answered
+    in order. Clients share the scene. `server_close` also drops the connected clients, which
+    see EOF as when the binary is killed.
+    """
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, port, resolution=(640, 480), ip='127.0.0.1', scene=None):
+        self.scene = scene if scene is not None else MockScene(resolution)
+        self.lock = threading.Lock()
+        self.connections = set()  # accepted sockets
+        super(MockUnrealServer, self).__init__((ip, port), _Handler)
+
+    def process_request(self, request, client_address):
+        self.connections.add(request)
+        super(MockUnrealServer, self).process_request(request, client_address)
+
+    def shutdown_request(self, request):
+        self.connections.discard(request)
+        super(MockUnrealServer, self).shutdown_request(request)
+
+    def server_close(self):
+        super(MockUnrealServer, self).server_close()
+        for sock in list(self.connections):
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        sock = self.request
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.send(b'connected to MockUnreal')
+        rfile = sock.makefile('rb')
+        try:
+            while True:
+                header = rfile.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    break
+                magic, size = _HEADER.unpack(header)
+                if magic != MAGIC:
+                    break
+                msg_id, _, cmd = rfile.read(size).partition(b':')
+                with self.server.lock:
+                    reply = self.server.scene.handle(cmd.decode('utf-8'))
+                self.send(msg_id + b':', reply if isinstance(reply, bytes) else reply.encode('utf-8'))
+        except OSError:
+            pass  # the client or the server closed the connection
+
+    def send(self, prefix, body=b''):
+        self.request.sendall(_HEADER.pack(MAGIC, len(prefix) + len(body)) + prefix)
+        if body:
+            self.request.sendall(body)
+
+
+class RunMockUnreal(object):
+    """drop-in for `env_unreal.RunUnreal` that serves a `MockScene` from a thread of this process"""
+    def __init__(self):
+        self.path2env = tempfile.mkdtemp(prefix='mock_unreal_')
+        self.server = None
+
+    def start(self, docker, resolution=(160, 160), port=None):
+        port = 9000 if port is None else port
+        while self.server is None:
+            try:
+                self.server = MockUnrealServer(port, scene=MockScene(resolution, file_dir=self.path2env))
+            except OSError:
+                port += 1
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        print('Running mock env on port {}'.format(port))
+        return '127.0.0.1', port
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _format(values):
+    return ' '.join('{:.3f}'.format(v) for v in values)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=9000, help='unrealcv port to listen on')
+    parser.add_argument('--resolution', type=int, nargs=2, default=[640, 480], help='width and height of images')
+    parser.add_argument('--dt', type=float, default=0.1, help='simulated seconds per lit image')
+    parser.add_argument('--seed', type=int, default=0, help='seed of colors, waypoints and lights')
+    args = parser.parse_args()
+    server = MockUnrealServer(args.port, scene=MockScene(tuple(args.resolution), dt=args.dt, seed=args.seed))
+    print('Mock UnrealCV server on port {}'.format(args.port))
+    server.serve_forever()
@@ -0,0 +1,240 @@
+import asyncio
+import time
+from gym_unrealcv.envs.utils.unrealcv_basic import UnrealCv, CommandBatch, RequestExecutor, RequestError, _describe
+from gym_unrealcv.envs.utils.unrealcv_client import MAGIC, _HEADER, _REPLY, _BINARY
+
+
+class AsyncClient(object):
+    """asyncio counterpart of `unrealcv_client.Client`, speaking the same protocol.
+
+    Requests are sent as "{id}:{message}" and matched to the replies by id, so any number of
+    them can be in flight on one connection. Replies are returned as str, or as bytes for
+    png, bmp and npy images. `request` returns None on timeout or when the connection is
+    lost, which `AsyncRequestExecutor` retries.
+    """
+    def __init__(self, endpoint, message_handler=None):
+        self.endpoint = endpoint  # (ip, port)
+        self.message_handler = message_handler  # called with the messages pushed by the server
+        self.reader = None
+        self.writer = None
+        self.receiver = None
+        self.pending = dict()  # message id: (future, binary reply)
+        self.message_id = 0
+
+    def isconnected(self):
+        return self.receiver is not None and not self.receiver.done()
+
+    async def connect(self, timeout=1):
+        if self.isconnected():
+            return True
+        try:
+            self.reader, self.writer = await asyncio.wait_for(asyncio.open_connection(*self.endpoint), timeout)
+            # the server greets every client with "connected to {project}"
+            greeting = await asyncio.wait_for(self._read_message(), timeout)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+            await self.disconnect()
+            return False
+        if not greeting.startswith(b'connected'):
+            await self.disconnect()
+            return False
+        self.receiver = asyncio.ensure_future(self._receive())
+        return True
+
+    async def disconnect(self):
+        if self.receiver is not None:
+            self.receiver.cancel()
+            try:
+                await self.receiver
+            except asyncio.CancelledError:
+                pass
+            self.receiver = None
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        self._fail_pending()
+
+    async def request(self, message, timeout=5):
+        """reply to a message, or list of replies to a list of messages sent back to back"""
+        if not self.isconnected():
+            return None
+        messages = message if isinstance(message, list) else [message]
+        ids = [self._send(msg) for msg in messages]
+        futures = [self.pending[i][0] for i in ids]
+        try:
+            await self.writer.drain()
+            replies = await asyncio.wait_for(asyncio.gather(*futures), timeout)
+        except (OSError, asyncio.TimeoutError):
+            replies = [None]
+        finally:
+            for i in ids:
+                self.pending.pop(i, None)
+        if any(reply is None for reply in replies):
+            return None
+        return replies if isinstance(message, list) else replies[0]
+
+    def _send(self, message):
+        self.message_id += 1
+        binary = message.rsplit(' ', 1)[-1] in _BINARY
+        self.pending[self.message_id] = (asyncio.get_running_loop().create_future(), binary)
+        payload = '{}:{}'.format(self.message_id, message).encode('utf-8')
+        self.writer.write(_HEADER.pack(MAGIC, len(payload)) + payload)
+        return self.message_id
+
+    async def _read_message(self):
+        magic, size = _HEADER.unpack(await self.reader.readexactly(_HEADER.size))
+        if magic != MAGIC:
+            raise OSError('bad magic {:#x} from the UnrealCV server'.format(magic))
+        return await self.reader.readexactly(size)
+
+    async def _receive(self):
+        try:
+            while True:
+                payload = await self._read_message()
+                match = _REPLY.match(payload)
+                if match is None:
+                    if self.message_handler is not None:
+                        self.message_handler(payload.decode('utf-8', 'replace'))
+                    continue
+                future, binary = self.pending.get(int(match.group(1)), (None, False))
+                if future is None or future.done():
+                    continue  # timed out already
+                reply = payload[match.end():]
+                future.set_result(reply if binary else reply.decode('utf-8', 'replace'))
+        except (OSError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._fail_pending()
+
+    def _fail_pending(self):
+        for future, _ in self.pending.values():
+            if not future.done():
+                future.set_result(None)
+
+
+class AsyncRequestExecutor(RequestExecutor):
+    """`RequestExecutor` for an `AsyncClient`, with the same retries, backoff and stats"""
+    async def request(self, cmd):
+        self.stats['requests'] += 1
+        for delay in self._delays():
+            if delay:
+                self.stats['retries'] += 1
+                await asyncio.sleep(delay)
+            deadline = time.time() + self.timeout
+            if not self.client.isconnected():
+                self.stats['reconnects'] += 1
+                if not await self.client.connect(timeout=self.timeout):
+                    continue
+            res = await self.client.request(cmd, timeout=max(deadline - time.time(), 0))
+            if res is not None:
+                return res
+            self.stats['timeouts'] += 1
+        self.stats['failures'] += 1
+        raise RequestError('no reply to {} after {} retries'.format(_describe(cmd), self.retries))
+
+    async def connect(self):
+        for delay in self._connect_delays():
+            if delay:
+                await asyncio.sleep(delay)
+            if await self.client.connect():
+                return
+        raise RequestError('can not connect to the UnrealCV server in {} s'.format(self.connect_timeout))
+
+
+class AsyncUnrealCv(object):
+    """Coroutine version of the `UnrealCv` commands, on an `AsyncClient`.
+
+    One event loop can drive many Unreal instances at once, their network waits overlap:
+
+        unrealcvs = [AsyncUnrealCv(port) for port in ports]
+        await asyncio.gather(*(u.init_unrealcv(0) for u in unrealcvs))
+        images = await asyncio.gather(*(u.read_image(0, 'lit', 'fast') for u in unrealcvs))
+
+    Replies are parsed by `CommandBatch`, so results and the camera cache are the same as
+    with `UnrealCv`. Several commands can also be sent in one exchange with
+    `await self.batch()...send_async()`.
+    """
+    image_cmd = UnrealCv.image_cmd
+    decode_image = UnrealCv.decode_image
+    decode_png = UnrealCv.decode_png
+    decode_bmp = UnrealCv.decode_bmp
+    decode_depth = UnrealCv.decode_depth
+
+    def __init__(self, port, ip='127.0.0.1', resolution=(160, 120), request_config=None):
+        self.ip = ip
+        self.client = AsyncClient((ip, port))
+        self.executor = AsyncRequestExecutor(self.client, **(request_config or {}))
+        self.resolution = resolution
+        self.cam = dict()
+        for i in range(20):
+            self.cam[i] = dict(
+                 location=[0, 0, 0],
+                 rotation=[0, 0, 0],
+            )
+        self.img_color = None
+        self.img_depth = None
+
+    async def init_unrealcv(self, cam_id):
+        await self.executor.connect()
+        await self.request_batch([
+            'vrun setres {w}x{h}w'.format(w=self.resolution[0], h=self.resolution[1]),
+            'DisableAllScreenMessages',
+            'vrun sg.ShadowQuality 0',
+            'vrun sg.TextureQuality 0',
+            'vrun sg.EffectsQuality 0'])
+        await self.get_pose(cam_id)
+
+    async def close(self):
+        await self.client.disconnect()
+
+    async def request(self, cmd):
+        return await self.executor.request(cmd)
+
+    async def request_batch(self, cmds):
+        return await self.request(list(cmds))
+
+    def batch(self):
+        return CommandBatch(self)
+
+    async def read_image(self, cam_id, viewmode, mode='fast', out=None):
+        # mode: direct or fast
+        return await self._send_one(self.batch().read_image(cam_id, viewmode, mode, out))
+
+    async def read_depth(self, cam_id, inverse=True, out=None):
+        return await self._send_one(self.batch().read_depth(cam_id, inverse, out))
+
+    async def get_observation(self, cam_id, observation_type, mode='fast'):
+        return await self._send_one(self.batch().get_observation(cam_id, observation_type, mode))
+
+    async def set_location(self, cam_id, loc):
+        return await self._send_one(self.batch().set_location(cam_id, loc))
+
+    async def get_location(self, cam_id):
+        return await self._send_one(self.batch().get_location(cam_id))
+
+    async def set_rotation(self, cam_id, rot):  # rot = [roll, yaw, pitch]
+        return await self._send_one(self.batch().set_rotation(cam_id, rot))
+
+    async def get_rotation(self, cam_id):
+        return await self._send_one(self.batch().get_rotation(cam_id))
+
+    async def set_pose(self, cam_id, pose):  # pose = [x, y, z, roll, yaw, pitch]
+        return await self._send_one(self.batch().set_location(cam_id, pose[:3]).set_rotation(cam_id, pose[-3:]))
+
+    async def get_pose(self, cam_id):
+        return await self._send_one(self.batch().get_pose(cam_id))
+
+    async def set_obj_location(self, obj, loc):
+        return await self._send_one(self.batch().set_obj_location(obj, loc))
+
+    async def get_obj_location(self, obj):
+        return await self._send_one(self.batch().get_obj_location(obj))
+
+    async def get_obj_pose(self, obj):
+        return await self._send_one(self.batch().get_obj_pose(obj))
+
+    async def vbp(self, target, func, *args):
+        # blueprint function call, e.g. vbp('target_C_0', 'set_speed', 100) for 'vbp target_C_0 set_speed 100'
+        return await self.request(' '.join(['vbp', target, func] + [str(arg) for arg in args]))
+
+    async def _send_one(self, batch):
+        return (await batch.send_async())[-1]
@@ -1,22 +1,22 @@
-import unrealcv
 import cv2
 import numpy as np
 import math
 import time
 import os
 import re
-from io import BytesIO
-import PIL.Image
+from gym_unrealcv.envs.utils.unrealcv_client import Client
 
 
 class UnrealCv(object):
-    def __init__(self, port, ip, env, cam_id, resolution):
+    def __init__(self, port, ip, env, cam_id, resolution, request_config=None):
+        # request_config: timeout, retries, backoff, max_backoff and connect_timeout of `RequestExecutor`
 
         if ip == '127.0.0.1':
             self.docker = False
         else:
             self.docker = True
-        self.client = unrealcv.Client((ip, port))
+        self.client = Client((ip, port))
+        self.executor = RequestExecutor(self.client, **(request_config or {}))
 
         self.envdir = env
         self.ip = ip
@@ -36,15 +36,14 @@ class UnrealCv(object):
         self.img_depth = None
 
     def init_unrealcv(self, cam_id, resolution=(320, 240)):
-        self.client.connect()
         self.check_connection()
-        self.client.request('vrun setres {w}x{h}w'.format(w=resolution[0], h=resolution[1]))
-        self.client.request('DisableAllScreenMessages')
-        self.client.request('vrun sg.ShadowQuality 0')
-        self.client.request('vrun sg.TextureQuality 0')
-        self.client.request('vrun sg.EffectsQuality 0')
-        # self.client.request('vrun r.ScreenPercentage 10')
-        # self.client.request('vrun t.maxFPS 100')
+        self.request('vrun setres {w}x{h}w'.format(w=resolution[0], h=resolution[1]))
+        self.request('DisableAllScreenMessages')
+        self.request('vrun sg.ShadowQuality 0')
+        self.request('vrun sg.TextureQuality 0')
+        self.request('vrun sg.EffectsQuality 0')
+        # self.request('vrun r.ScreenPercentage 10')
+        # self.request('vrun t.maxFPS 100')
         time.sleep(1)
         self.get_rotation(cam_id, 'hard')
         self.get_location(cam_id, 'hard')
@@ -54,71 +53,92 @@ class UnrealCv(object):
         msg = message
 
     def check_connection(self):
-        while self.client.isconnected() is False:
-            print ('UnrealCV server is not running. Please try again')
-            self.client.connect()
+        self.executor.connect()
+
+    def request(self, cmd):
+        # every command goes through the executor, which retries with backoff and counts failures
+        return self.executor.request(cmd)
 
     def show_img(self, img, title="raw_img"):
         cv2.imshow(title, img)
         cv2.waitKey(3)
 
     def get_objects(self):
-        objects = self.client.request('vget /objects')
+        objects = self.request('vget /objects')
         objects = objects.split()
         return objects
 
-    def read_image(self, cam_id, viewmode, mode='direct'):
+    def batch(self):
+        """a `CommandBatch` to send several commands in one exchange"""
+        return CommandBatch(self)
+
+    def request_batch(self, cmds):
+        # the client sends all commands before reading the replies, which come back in order
+        return self.request(list(cmds))
+
+    def read_image(self, cam_id, viewmode, mode='direct', out=None):
             # cam_id:0 1 2 ...
             # viewmode:lit,  =normal, depth, object_mask
             # mode: direct, file
-            if mode == 'direct':
-                cmd = 'vget /camera/{cam_id}/{viewmode} png'
-                res = None
-                while res is None:
-                    res = self.client.request(cmd.format(cam_id=cam_id, viewmode=viewmode))
-                image_rgb = self.decode_png(res)
-                image_rgb = image_rgb[:, :, :-1]  # delete alpha channel
-                image = image_rgb[:, :, ::-1]  # transpose channel order
+            # out: HxWx3 uint8 array to decode into (direct and fast)
+            if mode == 'direct' or mode == 'fast':
+                res = self.request(self.image_cmd(cam_id, viewmode, mode))
+                image = self.decode_image(res, mode, out)
 
             elif mode == 'file':
                 cmd = 'vget /camera/{cam_id}/{viewmode} {viewmode}{ip}.png'
                 if self.docker:
-                    img_dirs_docker = self.client.request(cmd.format(cam_id=cam_id, viewmode=viewmode,ip=self.ip))
+                    img_dirs_docker = self.request(cmd.format(cam_id=cam_id, viewmode=viewmode,ip=self.ip))
                     img_dirs = self.envdir + img_dirs_docker[7:]
                 else :
-                    img_dirs = self.client.request(cmd.format(cam_id=cam_id, viewmode=viewmode,ip=self.ip))
+                    img_dirs = self.request(cmd.format(cam_id=cam_id, viewmode=viewmode,ip=self.ip))
                 image = cv2.imread(img_dirs)
-            elif mode == 'fast':
-                cmd = 'vget /camera/{cam_id}/{viewmode} bmp'
-                res = None
-                while res is None:
-                    res = self.client.request(cmd.format(cam_id=cam_id, viewmode=viewmode))
-                image_rgba = self.decode_bmp(res)
-                image = image_rgba[:, :, :-1]  # delete alpha channel
             return image
 
-    def read_depth(self, cam_id, inverse=True):
+    def image_cmd(self, cam_id, viewmode, mode):
+        # mode: direct (png) or fast (bmp)
+        fmt = 'png' if mode == 'direct' else 'bmp'
+        return 'vget /camera/{cam_id}/{viewmode} {fmt}'.format(cam_id=cam_id, viewmode=viewmode, fmt=fmt)
+
+    def decode_image(self, res, mode, out=None):
+        # png (direct) or bmp (fast) reply to a contiguous BGR image, written to out if given
+        if mode == 'direct':
+            image = self.decode_png(res)
+            if out is None:
+                return image
+            np.copyto(out, image)
+            return out
+        # delete alpha channel, in the same pass as the copy out of the reply
+        return cv2.cvtColor(self.decode_bmp(res), cv2.COLOR_BGRA2BGR, dst=out)
+
+    def read_depth(self, cam_id, inverse=True, out=None):
         cmd = 'vget /camera/{cam_id}/depth npy'
-        res = self.client.request(cmd.format(cam_id=cam_id))
-        depth = np.fromstring(res, np.float32)
-        depth = depth[-self.resolution[1] * self.resolution[0]:]
+        res = self.request(cmd.format(cam_id=cam_id))
+        return self.decode_depth(res, inverse, out)
+
+    def decode_depth(self, res, inverse=True, out=None):
+        # out: HxWx1 float32 array to decode into
+        size = self.resolution[1] * self.resolution[0]
+        depth = np.frombuffer(res, np.float32, count=size, offset=len(res) - size * 4)
         depth = depth.reshape(self.resolution[1], self.resolution[0], 1)
         if inverse:
-            depth = 1/depth
+            return np.divide(1, depth, out=out)
         # cv2.imshow('depth', depth/depth.max())
         # cv2.waitKey(10)
-        return depth
+        if out is None:
+            return depth.copy()
+        np.copyto(out, depth)
+        return out
 
     def decode_png(self, res):
-        img = PIL.Image.open(BytesIO(res))
-        return np.asarray(img)
+        # BGR, the alpha channel is dropped
+        return cv2.imdecode(np.frombuffer(res, np.uint8), cv2.IMREAD_COLOR)
 
     def decode_bmp(self, res, channel=4):
-        img = np.fromstring(res, dtype=np.uint8)
-        img=img[-self.resolution[1]*self.resolution[0]*channel:]
-        img=img.reshape(self.resolution[1], self.resolution[0], channel)
-
-        return img
+        # read-only view of the pixels at the end of the reply, nothing is copied
+        size = self.resolution[1] * self.resolution[0] * channel
+        img = np.frombuffer(res, dtype=np.uint8, count=size, offset=len(res) - size)
+        return img.reshape(self.resolution[1], self.resolution[0], channel)
 
     def convert2planedepth(self, PointDepth, f=320):
         H = PointDepth.shape[0]
@@ -138,7 +158,7 @@ class UnrealCv(object):
 
     def set_pose(self, cam_id, pose):  # pose = [x, y, z, roll, yaw, pitch]
         cmd = 'vset /camera/{cam_id}/pose {x} {y} {z} {pitch} {yaw} {roll}'
-        self.client.request(cmd.format(cam_id=cam_id, x=pose[0], y=pose[1], z=pose[2], roll=pose[3], yaw=pose[4], pitch=pose[5]))
+        self.request(cmd.format(cam_id=cam_id, x=pose[0], y=pose[1], z=pose[2], roll=pose[3], yaw=pose[4], pitch=pose[5]))
         self.cam[cam_id]['location'] = pose[:3]
         self.cam[cam_id]['rotation'] = pose[-3:]
 
@@ -150,9 +170,7 @@ class UnrealCv(object):
 
         if mode == 'hard':
             cmd = 'vget /camera/{cam_id}/pose'
-            pose = None
-            while pose is None:
-                pose = self.client.request(cmd.format(cam_id=cam_id))
+            pose = self.request(cmd.format(cam_id=cam_id))
             pose = [float(i) for i in pose.split()]
             self.cam[cam_id]['location'] = pose[:3]
             self.cam[cam_id]['rotation'] = pose[-3:]
@@ -160,7 +178,7 @@ class UnrealCv(object):
 
     def set_location(self,cam_id, loc):  # loc=[x,y,z]
         cmd = 'vset /camera/{cam_id}/location {x} {y} {z}'
-        self.client.request(cmd.format(cam_id=cam_id, x=loc[0], y=loc[1], z=loc[2]))
+        self.request(cmd.format(cam_id=cam_id, x=loc[0], y=loc[1], z=loc[2]))
         self.cam[cam_id]['location'] = loc
 
     def get_location(self, cam_id, mode='hard'):
@@ -168,15 +186,13 @@ class UnrealCv(object):
             return self.cam[cam_id]['location']
         if mode == 'hard':
             cmd = 'vget /camera/{cam_id}/location'
-            location = None
-            while location is None:
-                location = self.client.request(cmd.format(cam_id=cam_id))
+            location = self.request(cmd.format(cam_id=cam_id))
             self.cam[cam_id]['location'] = [float(i) for i in location.split()]
             return self.cam[cam_id]['location']
 
     def set_rotation(self,cam_id, rot):  # rot = [roll, yaw, pitch]
         cmd = 'vset /camera/{cam_id}/rotation {pitch} {yaw} {roll}'
-        self.client.request(cmd.format(cam_id=cam_id, roll=rot[0], yaw=rot[1], pitch=rot[2]))
+        self.request(cmd.format(cam_id=cam_id, roll=rot[0], yaw=rot[1], pitch=rot[2]))
         self.cam[cam_id]['rotation'] = rot
 
     def get_rotation(self, cam_id, mode='hard'):
@@ -184,9 +200,7 @@ class UnrealCv(object):
             return self.cam[cam_id]['rotation']
         if mode == 'hard':
             cmd = 'vget /camera/{cam_id}/rotation'
-            rotation = None
-            while rotation is None:
-                rotation = self.client.request(cmd.format(cam_id=cam_id))
+            rotation = self.request(cmd.format(cam_id=cam_id))
             rotation = [float(i) for i in rotation.split()]
             rotation.reverse()
             self.cam[cam_id]['rotation'] = rotation
@@ -194,7 +208,7 @@ class UnrealCv(object):
 
     def moveto(self, cam_id, loc):
         cmd = 'vset /camera/{cam_id}/moveto {x} {y} {z}'
-        self.client.request(cmd.format(cam_id=cam_id, x=loc[0], y=loc[1], z=loc[2]))
+        self.request(cmd.format(cam_id=cam_id, x=loc[0], y=loc[1], z=loc[2]))
 
     def move_2d(self, cam_id, angle, length, height=0, pitch=0):
 
@@ -226,26 +240,26 @@ class UnrealCv(object):
 
     def keyboard(self, key, duration=0.01):  # Up Down Left Right
         cmd = 'vset /action/keyboard {key} {duration}'
-        return self.client.request(cmd.format(key=key, duration=duration))
+        return self.request(cmd.format(key=key, duration=duration))
 
     def get_obj_color(self, obj):
-        object_rgba = self.client.request('vget /object/{obj}/color'.format(obj=obj))
+        object_rgba = self.request('vget /object/{obj}/color'.format(obj=obj))
         object_rgba = re.findall(r"\d+\.?\d*", object_rgba)
         color = [int(i) for i in object_rgba]  # [r,g,b,a]
         return color[:-1]
 
     def set_obj_color(self, obj, color):
         cmd = 'vset /object/{obj}/color {r} {g} {b}'
-        self.client.request(cmd.format(obj=obj, r=color[0], g=color[1], b=color[2]))
+        self.request(cmd.format(obj=obj, r=color[0], g=color[1], b=color[2]))
         self.color_dict[obj] = color
 
     def set_obj_location(self, obj, loc):
         cmd = 'vset /object/{obj}/location {x} {y} {z}'
-        self.client.request(cmd.format(obj=obj, x=loc[0], y=loc[1], z=loc[2]))
+        self.request(cmd.format(obj=obj, x=loc[0], y=loc[1], z=loc[2]))
 
     def set_obj_rotation(self, obj, rot):
         cmd = 'vset /object/{obj}/rotation {pitch} {yaw} {roll}'
-        self.client.request(cmd.format(obj=obj, roll=rot[0], yaw=rot[1], pitch=rot[2]))
+        self.request(cmd.format(obj=obj, roll=rot[0], yaw=rot[1], pitch=rot[2]))
 
     def get_mask(self, object_mask, obj):
         [r, g, b] = self.color_dict[obj]
@@ -303,15 +317,11 @@ class UnrealCv(object):
         return color_dict
 
     def get_obj_location(self, obj):
-        location = None
-        while location is None:
-            location = self.client.request('vget /object/{obj}/location'.format(obj=obj))
+        location = self.request('vget /object/{obj}/location'.format(obj=obj))
         return [float(i) for i in location.split()]
 
     def get_obj_rotation(self, obj):# pitch yaw roll
-        rotation = None
-        while rotation is None:
-            rotation = self.client.request('vget /object/{obj}/rotation'.format(obj=obj))
+        rotation = self.request('vget /object/{obj}/rotation'.format(obj=obj))
         return [float(i) for i in rotation.split()]
 
     def get_obj_pose(self, obj):
@@ -329,10 +339,10 @@ class UnrealCv(object):
         return pose_dic
 
     def hide_obj(self, obj):
-        self.client.request('vset /object/{obj}/hide'.format(obj=obj))
+        self.request('vset /object/{obj}/hide'.format(obj=obj))
 
     def show_obj(self, obj):
-        self.client.request('vset /object/{obj}/show'.format(obj=obj))
+        self.request('vset /object/{obj}/show'.format(obj=obj))
 
     def hide_objects(self, objects):
         for obj in objects:
@@ -344,7 +354,226 @@ class UnrealCv(object):
 
     def set_fov(self, fov, cam_id=0):
         cmd = 'vset /camera/{cam_id}/horizontal_fieldofview {FOV}'
-        self.client.request(cmd.format(cam_id=cam_id, FOV=fov))
+        self.request(cmd.format(cam_id=cam_id, FOV=fov))
 
     def destroy_obj(self, obj):
-        self.client.request('vset /object/{obj}/destroy'.format(obj=obj))
+        self.request('vset /object/{obj}/destroy'.format(obj=obj))
+
+
+class CommandBatch(object):
+    """Commands queued to be sent to the UnrealCV server in one pipelined exchange,
+    instead of one round trip each.
+
+    The queue methods mirror those of `UnrealCv` and return the batch, so that calls can be
+    chained. `send` returns the result of every queued call in order, parsed the same way
+    as the `UnrealCv` method, or the raw reply for setters. The camera cache is updated the
+    same way too.
+
+    e.g. img, pose = unrealcv.batch().set_rotation(0, rot).read_image(0, 'lit', 'fast').get_pose(0).send()[1:]
+    """
+    def __init__(self, unrealcv):
+        self.unrealcv = unrealcv
+        self.calls = []  # (cmds, parser)
+
+    def __len__(self):
+        return len(self.calls)
+
+    def add(self, cmds, parser=None):
+        """queue a command, or a list of commands whose replies are parsed together
+
+        Args:
+            parser: called with the reply (list of replies) when the batch is sent
+        """
+        self.calls.append((cmds, parser))
+        return self
+
+    def send(self):
+        cmds = self._commands()
+        return self._parse(self.unrealcv.request_batch(cmds) if cmds else [])
+
+    async def send_async(self):
+        # for an `AsyncUnrealCv`, whose request_batch is a coroutine
+        cmds = self._commands()
+        return self._parse(await self.unrealcv.request_batch(cmds) if cmds else [])
+
+    def _commands(self):
+        cmds = []
+        for call_cmds, _ in self.calls:
+            cmds.extend(call_cmds if isinstance(call_cmds, list) else [call_cmds])
+        return cmds
+
+    def _parse(self, replies):
+        replies = iter(replies)
+        results = []
+        for call_cmds, parser in self.calls:
+            if isinstance(call_cmds, list):
+                res = [next(replies) for _ in call_cmds]
+            else:
+                res = next(replies)
+            results.append(res if parser is None else parser(res))
+        self.calls = []
+        return results
+
+    def set_location(self, cam_id, loc):
+        self.unrealcv.cam[cam_id]['location'] = loc
+        return self.add('vset /camera/{cam_id}/location {x} {y} {z}'.format(cam_id=cam_id, x=loc[0], y=loc[1], z=loc[2]))
+
+    def set_rotation(self, cam_id, rot):  # rot = [roll, yaw, pitch]
+        self.unrealcv.cam[cam_id]['rotation'] = rot
+        return self.add('vset /camera/{cam_id}/rotation {pitch} {yaw} {roll}'.format(
+            cam_id=cam_id, roll=rot[0], yaw=rot[1], pitch=rot[2]))
+
+    def get_location(self, cam_id):
+        return self.add('vget /camera/{cam_id}/location'.format(cam_id=cam_id),
+                        lambda res: self._parse_location(cam_id, res))
+
+    def get_rotation(self, cam_id):
+        return self.add('vget /camera/{cam_id}/rotation'.format(cam_id=cam_id),
+                        lambda res: self._parse_rotation(cam_id, res))
+
+    def get_pose(self, cam_id):  # pose = [x, y, z, roll, yaw, pitch]
+        return self.add(['vget /camera/{cam_id}/location'.format(cam_id=cam_id),
+                         'vget /camera/{cam_id}/rotation'.format(cam_id=cam_id)],
+                        lambda res: self._parse_location(cam_id, res[0]) + self._parse_rotation(cam_id, res[1]))
+
+    def set_obj_location(self, obj, loc):
+        return self.add('vset /object/{obj}/location {x} {y} {z}'.format(obj=obj, x=loc[0], y=loc[1], z=loc[2]))
+
+    def get_obj_location(self, obj):
+        return self.add('vget /object/{obj}/location'.format(obj=obj), _parse_floats)
+
+    def get_obj_pose(self, obj):
+        return self.add(['vget /object/{obj}/location'.format(obj=obj),
+                         'vget /object/{obj}/rotation'.format(obj=obj)],
+                        lambda res: _parse_floats(res[0]) + _parse_floats(res[1]))
+
+    def read_image(self, cam_id, viewmode, mode='direct', out=None):
+        # mode: direct or fast, files are not supported
+        return self.add(self.unrealcv.image_cmd(cam_id, viewmode, mode),
+                        lambda res: self.unrealcv.decode_image(res, mode, out))
+
+    def read_depth(self, cam_id, inverse=True, out=None):
+        return self.add('vget /camera/{cam_id}/depth npy'.format(cam_id=cam_id),
+                        lambda res: self.unrealcv.decode_depth(res, inverse, out))
+
+    def get_observation(self, cam_id, observation_type, mode='fast'):
+        """same as `Navigation.get_observation`, for Color, Depth, Rgbd and Mask"""
+        unrealcv = self.unrealcv
+        if observation_type == 'Color' or observation_type == 'Mask':
+            viewmode = 'lit' if observation_type == 'Color' else 'object_mask'
+            cmds = [unrealcv.image_cmd(cam_id, viewmode, mode)]
+        elif observation_type == 'Depth':
+            cmds = ['vget /camera/{cam_id}/depth npy'.format(cam_id=cam_id)]
+        elif observation_type == 'Rgbd':
+            cmds = [unrealcv.image_cmd(cam_id, 'lit', mode), 'vget /camera/{cam_id}/depth npy'.format(cam_id=cam_id)]
+        else:
+            raise ValueError('observation type {} can not be batched'.format(observation_type))
+
+        def parse(res):
+            if observation_type == 'Depth':
+                unrealcv.img_depth = state = unrealcv.decode_depth(res[0])
+                return state
+            unrealcv.img_color = state = unrealcv.decode_image(res[0], mode)
+            if observation_type == 'Rgbd':
+                unrealcv.img_depth = unrealcv.decode_depth(res[1])
+                state = np.append(unrealcv.img_color, unrealcv.img_depth, axis=2)
+            return state
+        return self.add(cmds, parse)
+
+    def _parse_location(self, cam_id, res):
+        self.unrealcv.cam[cam_id]['location'] = _parse_floats(res)
+        return self.unrealcv.cam[cam_id]['location']
+
+    def _parse_rotation(self, cam_id, res):
+        rotation = _parse_floats(res)
+        rotation.reverse()
+        self.unrealcv.cam[cam_id]['rotation'] = rotation
+        return self.unrealcv.cam[cam_id]['rotation']
+
+
+def _parse_floats(res):
+    return [float(i) for i in res.split()]
+
+
+class RequestError(RuntimeError):
+    """raised when a request is still unanswered after the whole retry budget"""
+
+
+class RequestExecutor(object):
+    """Sends the requests of an `UnrealCv` to the server, in place of busy-waiting on
+    `while res is None` loops.
+
+    Every attempt, reconnecting included, gets `timeout` seconds: the client is given what
+    is left of it, and an attempt without a reply counts as a timeout. The connection is
+    then dropped, and the next attempt starts on a new one after a delay that starts at
+    `backoff` and doubles up to `max_backoff`. `RequestError` is raised once `retries`
+    retries have failed, instead of hanging forever.
+
+    Connecting at startup has its own budget of `connect_timeout` seconds, to wait for the
+    binary to launch.
+
+    `stats` counts the requests, retries, timeouts, reconnects and failures since start.
+    """
+    def __init__(self, client, timeout=5, retries=10, backoff=0.01, max_backoff=2.0, connect_timeout=120):
+        self.client = client
+        self.timeout = timeout  # seconds to wait for the reply of every attempt
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.connect_timeout = connect_timeout
+        self.stats = dict(requests=0, retries=0, timeouts=0, reconnects=0, failures=0)
+
+    def request(self, cmd):
+        """reply to a command, or list of replies to a list of commands (see `CommandBatch`)"""
+        self.stats['requests'] += 1
+        for delay in self._delays():
+            if delay:
+                self.stats['retries'] += 1
+                time.sleep(delay)
+            deadline = time.time() + self.timeout
+            if not self.client.isconnected():
+                self.stats['reconnects'] += 1
+                if not self.client.connect(timeout=self.timeout):
+                    continue
+            res = self.client.request(cmd, timeout=max(deadline - time.time(), 0))
+            if res is not None:
+                return res
+            # the client drops the stalled connection, so that the retry reconnects
+            self.stats['timeouts'] += 1
+        self.stats['failures'] += 1
+        raise RequestError('no reply to {} after {} retries'.format(_describe(cmd), self.retries))
+
+    def connect(self):
+        """connect to the server, waiting up to connect_timeout seconds for it to start"""
+        for delay in self._connect_delays():
+            if delay:
+                print('UnrealCV server is not running. Please try again')
+                time.sleep(delay)
+            if self.client.connect():
+                return
+        raise RequestError('can not connect to the UnrealCV server in {} s'.format(self.connect_timeout))
+
+    def _delays(self):
+        # 0 for the first attempt, then the backoff of every retry
+        yield 0
+        delay = self.backoff
+        for _ in range(self.retries):
+            yield delay
+            delay = min(delay * 2, self.max_backoff)
+
+    def _connect_delays(self):
+        # the same backoff, until connect_timeout seconds have passed
+        deadline = time.time() + self.connect_timeout
+        yield 0
+        delay = self.backoff
+        while time.time() + delay < deadline:
+            yield delay
+            delay = min(delay * 2, self.max_backoff)
+
+
+def _describe(cmd):
+    if isinstance(cmd, list) and len(cmd) == 1:
+        cmd = cmd[0]
+    if isinstance(cmd, list):
+        return 'a batch of {} commands starting with "{}"'.format(len(cmd), cmd[0] if cmd else '')
+    return '"{}"'.format(cmd)
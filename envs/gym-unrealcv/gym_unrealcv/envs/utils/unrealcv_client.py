@@ -0,0 +1,117 @@
+import re
+import socket
+import struct
+import time
+
+# every message is framed as magic, payload size (uint32 each), payload
+MAGIC = 0x9E2B83C1
+_HEADER = struct.Struct('<II')
+_REPLY = re.compile(rb'(\d{1,8}):')
+_BINARY = ('png', 'bmp', 'npy')
+
+
+class Client(object):
+    """Synchronous UnrealCV client, speaking the protocol of `unrealcv.Client`.
+
+    The replies are read on the calling thread, without a receive thread, so a request
+    never waits longer than its `timeout`: the socket timeout is set to what is left of it
+    before every read. Requests are sent as "{id}:{message}" and the replies are matched
+    by id, so a late reply to a request that timed out is discarded instead of being
+    returned for the next one. Replies are returned as str, or as bytes for png, bmp and
+    npy images. `request` returns None on timeout or when the connection is lost, and
+    drops the connection then, so that the next `connect` starts clean.
+
+    Messages pushed by the server without an id are passed to `message_handler` while
+    reading the replies.
+    """
+    def __init__(self, endpoint, message_handler=None):
+        self.endpoint = endpoint  # (ip, port)
+        self.message_handler = message_handler  # called with the messages pushed by the server
+        self.sock = None
+        self.buffer = bytearray()
+        self.message_id = 0
+
+    def isconnected(self):
+        return self.sock is not None
+
+    def connect(self, timeout=1):
+        if self.isconnected():
+            return True
+        deadline = time.time() + timeout
+        try:
+            self.sock = socket.create_connection(self.endpoint, timeout)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            # the server greets every client with "connected to {project}"
+            greeting = self._read_message(deadline)
+        except OSError:
+            self.disconnect()
+            return False
+        if not greeting.startswith(b'connected'):
+            self.disconnect()
+            return False
+        return True
+
+    def disconnect(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+        self.buffer = bytearray()
+
+    def request(self, message, timeout=5):
+        """reply to a message, or list of replies to a list of messages sent back to back"""
+        if not self.isconnected():
+            return None
+        deadline = time.time() + timeout
+        messages = message if isinstance(message, list) else [message]
+        pending = dict()  # message id: index of the reply
+        frames = []
+        for i, msg in enumerate(messages):
+            self.message_id += 1
+            pending[self.message_id] = i
+            payload = '{}:{}'.format(self.message_id, msg).encode('utf-8')
+            frames.append(_HEADER.pack(MAGIC, len(payload)) + payload)
+        replies = [None] * len(messages)
+        try:
+            self.sock.settimeout(max(deadline - time.time(), 1e-3))
+            self.sock.sendall(b''.join(frames))
+            while pending:
+                payload = self._read_message(deadline)
+                match = _REPLY.match(payload)
+                if match is None:
+                    if self.message_handler is not None:
+                        self.message_handler(payload.decode('utf-8', 'replace'))
+                    continue
+                i = pending.pop(int(match.group(1)), None)
+                if i is None:
+                    continue  # reply to a request that timed out
+                reply = payload[match.end():]
+                binary = messages[i].rsplit(' ', 1)[-1] in _BINARY
+                replies[i] = reply if binary else reply.decode('utf-8', 'replace')
+        except OSError:  # socket.timeout as well
+            self.disconnect()
+            return None
+        return replies if isinstance(message, list) else replies[0]
+
+    def _read_message(self, deadline):
+        header = self._read(_HEADER.size, deadline)
+        magic, size = _HEADER.unpack(header)
+        if magic != MAGIC:
+            raise OSError('bad magic {:#x} from the UnrealCV server'.format(magic))
+        return self._read(size, deadline)
+
+    def _read(self, size, deadline):
+        while len(self.buffer) < size:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise socket.timeout('no reply from the UnrealCV server')
+            self.sock.settimeout(remaining)
+            chunk = self.sock.recv(max(size - len(self.buffer), 1 << 16))
+            if not chunk:
+                raise ConnectionError('connection closed by the UnrealCV server')
+            self.buffer += chunk
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
@@ -2,5 +2,5 @@ from setuptools import setup
 
 setup(name='gym_unrealcv',
       version='1.0.0',
-      install_requires=['gym', 'matplotlib', 'numpy', 'unrealcv'],  # And any other dependencies foo needs
+      install_requires=['gym', 'matplotlib', 'numpy'],  # And any other dependencies foo needs
 )
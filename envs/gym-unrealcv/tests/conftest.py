@@ -0,0 +1,26 @@
+import threading
+import pytest
+from gym_unrealcv.envs.tracking.interaction import Tracking
+from gym_unrealcv.envs.utils.mock_unreal import MockUnrealServer
+
+RESOLUTION = (64, 48)
+
+
+@pytest.fixture
+def server():
+    server = MockUnrealServer(0, resolution=RESOLUTION)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(scope='module')
+def unrealcv():
+    server = MockUnrealServer(0, resolution=RESOLUTION)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    unrealcv = Tracking(env=None, port=server.server_address[1], resolution=RESOLUTION)
+    yield unrealcv
+    unrealcv.client.disconnect()
+    server.shutdown()
+    server.server_close()
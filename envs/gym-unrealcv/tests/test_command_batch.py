@@ -0,0 +1,71 @@
+import gym
+import numpy as np
+import pytest
+import gym_unrealcv
+
+RESOLUTION = (64, 48)  # of the unrealcv fixture, see conftest.py
+
+
+def test_replies_to_calls(unrealcv):
+    unrealcv.set_location(0, [10, 20, 30])
+    unrealcv.set_rotation(0, [0, 45, -15])
+    unrealcv.set_obj_location('target', [100, -50, 0])
+    res = unrealcv.batch().get_location(0).get_obj_pose('target').get_rotation(0).get_pose(0) \
+        .get_obj_location('target').send()
+    assert res == [unrealcv.get_location(0), unrealcv.get_obj_pose('target'), unrealcv.get_rotation(0),
+                   unrealcv.get_pose(0), unrealcv.get_obj_location('target')]
+    assert res[2] == [0, 45, -15]
+    assert res[3] == [10, 20, 30, 0, 45, -15]
+
+
+def test_camera_cache(unrealcv):
+    batch = unrealcv.batch().set_location(0, [1, 2, 3]).set_rotation(0, [0, 30, -10])
+    # setters update the cache when queued, before the exchange
+    assert unrealcv.get_rotation(0, 'soft') == [0, 30, -10]
+    assert batch.send() == ['ok', 'ok']
+    assert unrealcv.get_location(0, 'hard') == [1, 2, 3]
+    assert unrealcv.get_rotation(0, 'hard') == [0, 30, -10]
+    # getters update it when their reply is parsed
+    unrealcv.cam[0]['rotation'] = [0, 0, 0]
+    unrealcv.batch().get_pose(0).send()
+    assert unrealcv.cam[0]['location'] == [1, 2, 3]
+    assert unrealcv.get_rotation(0, 'soft') == [0, 30, -10]
+
+
+def test_observations(unrealcv):
+    unrealcv.set_rotation(0, [0, 60, -20])
+    color, depth, rgbd = unrealcv.batch().read_image(0, 'lit', 'fast').read_depth(0) \
+        .get_observation(0, 'Rgbd').send()
+    assert color.shape == (RESOLUTION[1], RESOLUTION[0], 3) and color.flags.writeable
+    np.testing.assert_array_equal(color, unrealcv.read_image(0, 'lit', 'fast'))
+    np.testing.assert_array_equal(depth, unrealcv.read_depth(0))
+    assert rgbd.shape == (RESOLUTION[1], RESOLUTION[0], 4)
+    np.testing.assert_array_equal(rgbd[..., :3], color)
+    assert unrealcv.img_color is not None and unrealcv.img_depth is not None
+    assert unrealcv.batch().send() == []
+
+
+@pytest.mark.parametrize('env_id', ['UnrealTrack-GeometryTrackRam-DiscreteColor-v0',
+                                    'UnrealTrack-ForestTrack-DiscreteColor-v0'])
+def test_env_steps(env_id):
+    env = gym.make(env_id, mock=True, resolution=RESOLUTION).unwrapped
+    try:
+        unrealcv, cam_id, target = env.unrealcv, env.cam_id, env.target_list[0]
+        state = env.reset()
+        assert state.shape == (RESOLUTION[1], RESOLUTION[0], 3)
+        assert env.unrealcv.get_location(cam_id, 'soft') == env.unrealcv.get_location(cam_id, 'hard')
+        for action in [[5, 0], [-3, 2], [0, -1], None]:
+            rotation = unrealcv.get_rotation(cam_id, 'soft')
+            state, reward, done, info = env.step(action)
+            assert state.shape == (RESOLUTION[1], RESOLUTION[0], 3)
+            assert type(reward) is float
+            # the batched replies match the calls sent one by one, and the cache the server
+            assert info['Pose'] == unrealcv.get_pose(cam_id)
+            assert env.target_pos == unrealcv.get_obj_pose(target)
+            assert unrealcv.get_rotation(cam_id, 'soft') == info['Pose'][3:]
+            np.testing.assert_array_equal(state, unrealcv.img_color)
+            if action is not None:
+                np.testing.assert_allclose(info['Pose'][4:], [rotation[1] + action[0], rotation[2] + action[1]],
+                                           atol=1e-3)
+    finally:
+        env.close()
@@ -0,0 +1,45 @@
+import io
+import cv2
+import numpy as np
+
+RESOLUTION = (64, 48)  # of the unrealcv fixture, see conftest.py
+SHAPE = (RESOLUTION[1], RESOLUTION[0])
+
+
+def test_decode_bmp(unrealcv):
+    res = unrealcv.request('vget /camera/0/lit bmp')
+    expected = cv2.imdecode(np.frombuffer(res, np.uint8), cv2.IMREAD_COLOR)
+    pixels = unrealcv.decode_bmp(res)
+    assert pixels.shape == SHAPE + (4,) and not pixels.flags.writeable
+    np.testing.assert_array_equal(pixels[..., :3], expected)
+    image = unrealcv.decode_image(res, 'fast')
+    assert image.flags.c_contiguous and image.flags.writeable
+    np.testing.assert_array_equal(image, expected)
+    out = np.zeros(SHAPE + (3,), np.uint8)
+    assert unrealcv.decode_image(res, 'fast', out) is out
+    np.testing.assert_array_equal(out, expected)
+
+
+def test_decode_png(unrealcv):
+    res = unrealcv.request('vget /camera/0/lit png')
+    expected = cv2.imdecode(np.frombuffer(res, np.uint8), cv2.IMREAD_COLOR)
+    np.testing.assert_array_equal(unrealcv.decode_image(res, 'direct'), expected)
+    out = np.zeros(SHAPE + (3,), np.uint8)
+    assert unrealcv.decode_image(res, 'direct', out) is out
+    np.testing.assert_array_equal(out, expected)
+
+
+def test_decode_depth(unrealcv):
+    unrealcv.set_location(0, [0, 0, 200])  # above the floor, every pixel has a positive depth
+    res = unrealcv.request('vget /camera/0/depth npy')
+    expected = np.load(io.BytesIO(res)).reshape(SHAPE + (1,))
+    assert np.all(expected > 0)
+    depth = unrealcv.decode_depth(res, inverse=False)
+    assert depth.dtype == np.float32 and depth.flags.writeable
+    np.testing.assert_array_equal(depth, expected)
+    np.testing.assert_allclose(unrealcv.decode_depth(res), 1 / expected)
+    out = np.zeros(SHAPE + (1,), np.float32)
+    assert unrealcv.decode_depth(res, inverse=True, out=out) is out
+    np.testing.assert_allclose(out, 1 / expected)
+    assert unrealcv.decode_depth(res, inverse=False, out=out) is out
+    np.testing.assert_array_equal(out, expected)
@@ -0,0 +1,47 @@
+import time
+import pytest
+from gym_unrealcv.envs.utils.unrealcv_basic import RequestExecutor, RequestError
+from gym_unrealcv.envs.utils.unrealcv_client import Client
+
+
+def make_executor(server, **kwargs):
+    client = Client(('127.0.0.1', server.server_address[1]))
+    executor = RequestExecutor(client, **kwargs)
+    executor.connect()
+    return executor
+
+
+def test_request(server):
+    executor = make_executor(server, timeout=1)
+    assert executor.request('vset /camera/0/location 1 2 3') == 'ok'
+    assert executor.request(['vget /camera/0/location', 'vget /camera/0/rotation']) == \
+        ['1.000 2.000 3.000', '0.000 0.000 0.000']
+    assert executor.stats['timeouts'] == 0
+
+
+def test_stalled_server(server):
+    executor = make_executor(server, timeout=0.2, retries=2, backoff=0.01)
+    tic = time.time()
+    # the server reads the requests but does not reply while the scene is locked
+    with server.lock:
+        with pytest.raises(RequestError):
+            executor.request(['vget /camera/0/location', 'vget /camera/0/rotation'])
+    # 3 attempts of 0.2 s, reconnects included, and 0.03 s of backoff
+    assert time.time() - tic < 0.8
+    assert executor.stats['timeouts'] == 3
+    assert executor.stats['retries'] == 2
+    assert executor.stats['reconnects'] == 2
+    assert executor.stats['failures'] == 1
+    # the stalled replies come late on dropped connections, the new one gets its own
+    assert executor.request('vget /camera/0/location') == '0.000 0.000 0.000'
+    assert executor.request('vget /camera/0/rotation') == '0.000 0.000 0.000'
+
+
+def test_connect_timeout(server):
+    port = server.server_address[1]
+    server.shutdown()
+    server.server_close()
+    executor = RequestExecutor(Client(('127.0.0.1', port)), backoff=0.01, max_backoff=0.1,
+                               connect_timeout=0.5)
+    with pytest.raises(RequestError):
+        executor.connect()
@@ -0,0 +1,79 @@
+import asyncio
+import time
+import numpy as np
+import pytest
+from gym_unrealcv.envs.utils.unrealcv_async import AsyncClient, AsyncUnrealCv
+from gym_unrealcv.envs.utils.unrealcv_basic import RequestError
+
+RESOLUTION = (64, 48)  # of the server fixture, see conftest.py
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_request(server):
+    async def main():
+        client = AsyncClient(('127.0.0.1', server.server_address[1]))
+        assert await client.connect()
+        assert await client.request('vset /camera/0/location 1 2 3') == 'ok'
+        # replies are matched by id, whatever the order the requests are awaited in
+        replies = await asyncio.gather(client.request('vget /camera/0/location'),
+                                       client.request(['vget /camera/0/rotation', 'vget /camera/0/lit bmp']),
+                                       client.request('vget /camera/1/location'))
+        await client.disconnect()
+        return replies
+    location, (rotation, bmp), other = run(main())
+    assert location == '1.000 2.000 3.000'
+    assert rotation == '0.000 0.000 0.000' and other == '0.000 0.000 0.000'
+    assert isinstance(bmp, bytes) and bmp.startswith(b'BM')
+
+
+def test_late_reply(server):
+    async def main():
+        client = AsyncClient(('127.0.0.1', server.server_address[1]))
+        assert await client.connect()
+        await client.request('vset /camera/0/location 1 2 3')
+        # the server reads the request but does not reply while the scene is locked
+        with server.lock:
+            assert await client.request('vget /camera/0/location', timeout=0.1) is None
+        # the late reply to the location comes first on the same connection and is dropped
+        rotation = await client.request('vget /camera/0/rotation', timeout=1)
+        await client.disconnect()
+        return rotation
+    assert run(main()) == '0.000 0.000 0.000'
+
+
+def test_server_closed(server):
+    async def main():
+        unrealcv = AsyncUnrealCv(server.server_address[1], resolution=RESOLUTION,
+                                 request_config=dict(timeout=0.2, retries=2))
+        await unrealcv.init_unrealcv(0)
+        server.shutdown()
+        server.server_close()
+        tic = time.time()
+        with pytest.raises(RequestError):
+            await unrealcv.get_location(0)
+        return time.time() - tic, unrealcv.executor.stats
+    elapsed, stats = run(main())
+    assert elapsed < 1 and stats['failures'] == 1
+
+
+def test_async_unrealcv(server, unrealcv):
+    # unrealcv is the synchronous fixture, on a server of its own
+    async def main():
+        async_unrealcv = AsyncUnrealCv(server.server_address[1], resolution=RESOLUTION)
+        await async_unrealcv.init_unrealcv(0)
+        await async_unrealcv.set_pose(0, [10, 20, 30, 0, 45, -15])
+        await async_unrealcv.set_obj_location('target', [100, -50, 0])
+        res = await asyncio.gather(async_unrealcv.get_pose(0), async_unrealcv.get_obj_pose('target'),
+                                   async_unrealcv.read_image(0, 'lit', 'fast'), async_unrealcv.read_depth(0))
+        await async_unrealcv.close()
+        return res, async_unrealcv.cam[0]
+    (pose, obj_pose, image, depth), cam = run(main())
+    unrealcv.set_pose(0, [10, 20, 30, 0, 45, -15])
+    unrealcv.set_obj_location('target', [100, -50, 0])
+    assert pose == unrealcv.get_pose(0) == cam['location'] + cam['rotation']
+    assert obj_pose == unrealcv.get_obj_pose('target')
+    np.testing.assert_array_equal(image, unrealcv.read_image(0, 'lit', 'fast'))
+    np.testing.assert_array_equal(depth, unrealcv.read_depth(0))
@@ -0,0 +1,48 @@
+import json
+import argparse
+import numpy as np
+import torch
+from trackers.transt.transt import TrackerTransT
+from benchmark import replay_frames, compare_trackers
+
+
+def fusion_configs(layers, exit_scores):
+    """(name, TrackerTransT kwargs) of every reduced-depth and early-exit setting"""
+    configs = [(f'layers={n}', {'fusion_layers': n}) for n in layers]
+    configs += [(f'exit_score={s}', {'exit_score': s}) for s in exit_scores]
+    return configs
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model_path', type=str, required=True, help='TransT model path')
+    parser.add_argument('--replay', type=str, nargs='+', required=True, help='recorded episodes to track')
+    parser.add_argument('--layers', type=int, nargs='*', default=[1, 2, 3], help='numbers of fusion layers to try')
+    parser.add_argument('--exit_scores', type=float, nargs='*', default=[0.9, 0.95], help='early exit scores to try')
+    parser.add_argument('--num_frames', type=int, default=200, help='max frames used from every episode')
+    parser.add_argument('--threads', type=int, default=None, help='torch CPU threads')
+    parser.add_argument('--output', type=str, default=None, help='save the results to this json file')
+    args = parser.parse_args()
+
+    if args.threads is not None:
+        torch.set_num_threads(args.threads)
+    episodes = [replay_frames(replay, args.num_frames) for replay in args.replay]
+    ref = TrackerTransT(args.model_path)
+
+    # IoU against the full network and speedup, averaged over the episodes
+    results = {}
+    for name, kwargs in fusion_configs(args.layers, args.exit_scores):
+        test = TrackerTransT(args.model_path, **kwargs)
+        runs = [compare_trackers(ref, test, frames, init_bbox) for frames, init_bbox in episodes]
+        results[name] = {
+            'mean_iou': float(np.mean([r['mean_iou'] for r in runs])),
+            'min_iou': float(np.min([r['min_iou'] for r in runs])),
+            'mean_center_error': float(np.mean([r['mean_center_error'] for r in runs])),
+            'fps': float(np.mean([r['test_fps'] for r in runs])),
+            'speedup': float(np.mean([r['test_fps'] / r['ref_fps'] for r in runs])),
+            'episodes': dict(zip(args.replay, runs)),
+        }
+        print(name + '\t' + '\t'.join(f'{k}={v:.3f}' for k, v in results[name].items() if k != 'episodes'))
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
@@ -0,0 +1,82 @@
+import json
+import time
+import functools
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+import numpy as np
+
+
+class Profiler(object):
+    """record wall time of every stage of the evaluation loop
+
+    Note that on GPU the kernels run asynchronously, so the time of the
+    network forward shows up in the stage that first waits for its result
+    (post-processing, which copies the scores back to the host).
+    """
+    def __init__(self):
+        self.records = defaultdict(list)
+
+    @contextmanager
+    def stage(self, name):
+        tic = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.records[name].append(time.perf_counter() - tic)
+
+    def instrument(self, obj, method, name):
+        """time every call of `obj.method` as stage `name`"""
+        func = getattr(obj, method)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with self.stage(name):
+                return func(*args, **kwargs)
+        setattr(obj, method, wrapper)
+
+    def summary(self):
+        """
+        Returns:
+            (dict): count, total, mean and p50/p95/p99 latency (ms) of every stage,
+                and the fps computed from the 'step' stage
+        """
+        stages = {}
+        for name, times in self.records.items():
+            times = np.array(times) * 1000
+            stages[name] = {
+                'count': len(times),
+                'total_ms': float(times.sum()),
+                'mean_ms': float(times.mean()),
+                'p50_ms': float(np.percentile(times, 50)),
+                'p95_ms': float(np.percentile(times, 95)),
+                'p99_ms': float(np.percentile(times, 99)),
+            }
+        res = {'stages': stages}
+        if 'step' in stages:
+            res['steps'] = stages['step']['count']
+            res['fps'] = 1000 * stages['step']['count'] / stages['step']['total_ms']
+        return res
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=4)
+
+
+_profiler = None
+_null_stage = nullcontext()
+
+def enable(profiler=None):
+    """make `profiler` the one used by `stage`, a new one is created if None"""
+    global _profiler
+    _profiler = Profiler() if profiler is None else profiler
+    return _profiler
+
+def disable():
+    global _profiler
+    _profiler = None
+
+def stage(name):
+    """time a block as stage `name` of the enabled profiler, no-op if disabled"""
+    if _profiler is None:
+        return _null_stage
+    return _profiler.stage(name)
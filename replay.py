@@ -0,0 +1,149 @@
+"""record UnrealCv episodes and replay them without the simulator
+
+An episode is saved in a directory:
+    index.json          frame shape, chunk size, number of frames, env id, max direction
+    frames_XXXXX.bin    raw uint8 frames, `chunk_size` frames per file
+    meta.npz            per step arrays: action, reward, done, direction, camera pose, target pose
+
+Frame 0 is the observation returned by `reset`, frame t (t >= 1) is the one
+returned by the t-th `step`, whose results are in the (t-1)-th row of meta.
+"""
+import os
+import json
+import gym
+import numpy as np
+from gym.spaces.box import Box
+
+
+class RecordWrapper(gym.Wrapper):
+    """save observations, actions, rewards, camera and target poses of an episode
+
+    Args:
+        env (gym.Env): UnrealCv env made by gym.make, e.g. UnrealCvGeometry
+        path (str): directory to save the episode
+        chunk_size (int): frames per chunk file
+    """
+    def __init__(self, env, path, chunk_size=500):
+        super(RecordWrapper, self).__init__(env)
+        self.path = path
+        self.chunk_size = chunk_size
+        self.env_id = env.spec.id if env.spec is not None else None
+        self.max_direction = getattr(env.unwrapped, 'max_direction', None)
+        self.frame_file = None
+
+    def reset(self, **kwargs):
+        obs = self.env.reset(**kwargs)
+        self._close_episode()
+        os.makedirs(self.path, exist_ok=True)
+        self.num_frames = 0
+        self.shape = obs.shape
+        self.meta = {k: [] for k in ['action', 'reward', 'done', 'direction', 'cam_pose', 'target_pose']}
+        self._write_frame(obs)
+        return obs
+
+    def step(self, action):
+        obs, reward, done, info = self.env.step(action)
+        self._write_frame(obs)
+        self.meta['action'].append(np.array(action, dtype=np.float32))
+        self.meta['reward'].append(reward)
+        self.meta['done'].append(done)
+        self.meta['direction'].append(info['Direction'])
+        self.meta['cam_pose'].append(np.array(info['Pose'], dtype=np.float32))
+        self.meta['target_pose'].append(np.array(self.env.unwrapped.target_pos, dtype=np.float32))
+        return obs, reward, done, info
+
+    def close(self):
+        self._close_episode()
+        return self.env.close()
+
+    def _write_frame(self, obs):
+        if self.num_frames % self.chunk_size == 0:
+            if self.frame_file is not None:
+                self.frame_file.close()
+            chunk = self.num_frames // self.chunk_size
+            self.frame_file = open(os.path.join(self.path, f'frames_{chunk:05d}.bin'), 'wb')
+        np.ascontiguousarray(obs, dtype=np.uint8).tofile(self.frame_file)
+        self.num_frames += 1
+
+    def _close_episode(self):
+        if self.frame_file is None:
+            return
+        self.frame_file.close()
+        self.frame_file = None
+        index = {
+            'env_id': self.env_id,
+            'max_direction': self.max_direction,
+            'shape': list(self.shape),
+            'chunk_size': self.chunk_size,
+            'num_frames': self.num_frames,
+        }
+        with open(os.path.join(self.path, 'index.json'), 'w') as f:
+            json.dump(index, f, indent=4)
+        np.savez(os.path.join(self.path, 'meta.npz'),
+                 **{k: np.array(v) for k, v in self.meta.items()})
+
+
+class ReplayEnv(gym.Env):
+    """play a recorded episode back with the same interface as the UnrealCv envs,
+    frames are memory-mapped so they are served at disk speed
+
+    Actions are ignored: the camera follows the recorded trajectory, and the
+    recorded rewards are returned. This is for benchmarking and regression
+    testing trackers, not for evaluating the camera control.
+
+    Args:
+        path (str): directory saved by `RecordWrapper`
+    """
+    def __init__(self, path):
+        with open(os.path.join(path, 'index.json')) as f:
+            self.index = json.load(f)
+        shape = tuple(self.index['shape'])
+        chunk_size = self.index['chunk_size']
+        num_frames = self.index['num_frames']
+        self.chunks = []
+        for chunk in range((num_frames + chunk_size - 1) // chunk_size):
+            n = min(chunk_size, num_frames - chunk * chunk_size)
+            self.chunks.append(np.memmap(os.path.join(path, f'frames_{chunk:05d}.bin'),
+                                         dtype=np.uint8, mode='r', shape=(n,) + shape))
+        self.chunk_size = chunk_size
+        self.num_frames = num_frames
+        self.max_direction = self.index.get('max_direction')
+        with np.load(os.path.join(path, 'meta.npz')) as meta:
+            self.meta = {k: meta[k] for k in meta.files}
+        self.observation_space = Box(low=0, high=255, shape=shape, dtype=np.uint8)
+        self.action_space = Box(low=-np.inf, high=np.inf, shape=(2,), dtype=np.float32)
+        self.count_steps = 0
+
+    def frame(self, t):
+        return self.chunks[t // self.chunk_size][t % self.chunk_size]
+
+    def reset(self):
+        self.count_steps = 0
+        return self.frame(0)
+
+    def step(self, action=None):
+        t = self.count_steps
+        self.count_steps += 1
+        done = bool(self.meta['done'][t]) or self.count_steps >= self.num_frames - 1
+        info = dict(
+            Done=done,
+            Reward=float(self.meta['reward'][t]),
+            Action=self.meta['action'][t],
+            Direction=float(self.meta['direction'][t]),
+            Pose=self.meta['cam_pose'][t].tolist(),
+            TargetPose=self.meta['target_pose'][t].tolist(),
+            Steps=self.count_steps,
+        )
+        return self.frame(self.count_steps), info['Reward'], done, info
+
+    def start(self):
+        pass
+
+    def close(self):
+        pass
+
+    def render(self, mode='rgb_array', close=False):
+        return self.frame(self.count_steps)
+
+    def seed(self, seed=None):
+        pass
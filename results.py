@@ -0,0 +1,190 @@
+"""append-only store of evaluation metrics
+
+Every episode is saved as one `.npz` chunk in the store directory, holding two
+NumPy structured arrays:
+    episode     one row: tracker, env, seed, episode id, AR, EL, lost frames, ...
+    steps       one row per step: reward, direction error, step latency, lost
+
+Chunks are never modified, so parallel workers can write into the same store
+without locking. Use `load_episodes`, `load_steps` and `aggregate` to compare
+results across trackers, envs and seeds, or run this file from the command line.
+"""
+import os
+import time
+import argparse
+import numpy as np
+
+EPISODE_DTYPE = np.dtype([
+    ('tracker', 'U32'),
+    ('env', 'U64'),
+    ('seed', 'i8'),
+    ('episode', 'i8'),
+    ('time', 'f8'),             # unix time the episode finished
+    ('ar', 'f8'),               # accumulated reward
+    ('el', 'i8'),               # episode length, 0 if not done within max steps
+    ('steps', 'i8'),
+    ('lost_frames', 'i8'),
+    ('mean_direction_error', 'f8'),
+    ('mean_latency_ms', 'f8'),
+    ('p95_latency_ms', 'f8'),
+])
+
+STEP_DTYPE = np.dtype([
+    ('step', 'i8'),
+    ('reward', 'f8'),
+    ('direction', 'f8'),        # target direction relative to the camera, in degrees
+    ('latency_ms', 'f8'),
+    ('lost', '?'),              # target out of the field of view
+])
+
+
+class ResultStore(object):
+    """
+    Args:
+        path (str): directory of the store, created if not existing
+    """
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def append(self, tracker, env, seed, episode, el, rewards, directions, latencies, max_direction=None):
+        """save the metrics of one episode
+
+        Args:
+            tracker (str), env (str), seed (int), episode (int): keys of the episode
+            el (int): episode length, 0 if not done within max steps
+            rewards, directions, latencies (list): per step reward, direction (degree)
+                and latency (second)
+            max_direction (float): field of view of the camera, a step is lost if
+                |direction| > max_direction / 2, no step is lost if None
+        Returns:
+            (str): path of the chunk
+        """
+        steps = np.zeros(len(rewards), dtype=STEP_DTYPE)
+        steps['step'] = np.arange(len(rewards))
+        steps['reward'] = rewards
+        steps['direction'] = directions
+        steps['latency_ms'] = np.array(latencies) * 1000
+        if max_direction is not None:
+            steps['lost'] = np.abs(steps['direction']) > max_direction / 2
+
+        row = np.zeros(1, dtype=EPISODE_DTYPE)
+        row['tracker'] = tracker
+        row['env'] = env
+        row['seed'] = seed
+        row['episode'] = episode
+        row['time'] = time.time()
+        row['ar'] = steps['reward'].sum()
+        row['el'] = el
+        row['steps'] = len(steps)
+        if len(steps):
+            row['lost_frames'] = steps['lost'].sum()
+            row['mean_direction_error'] = np.abs(steps['direction']).mean()
+            row['mean_latency_ms'] = steps['latency_ms'].mean()
+            row['p95_latency_ms'] = np.percentile(steps['latency_ms'], 95)
+
+        name = f'{tracker}_{seed}_{episode}_{time.time_ns()}_{os.getpid()}.npz'
+        chunk = os.path.join(self.path, name)
+        # write to a temp file first, so readers never see a partial chunk
+        tmp = chunk + '.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez(f, episode=row, steps=steps)
+        os.replace(tmp, chunk)
+        return chunk
+
+    def chunks(self):
+        return sorted(os.path.join(self.path, f) for f in os.listdir(self.path) if f.endswith('.npz'))
+
+
+def _match(row, filters):
+    return all(row[k] in v if isinstance(v, (list, tuple, set)) else row[k] == v
+               for k, v in filters.items())
+
+
+def load_episodes(path, **filters):
+    """
+    Args:
+        path (str): directory of the store
+        filters: keep episodes whose field equals the value (or is in the list),
+            e.g. tracker='siamfc', seed=[1, 2]
+    Returns:
+        (ndarray): structured array of EPISODE_DTYPE
+    """
+    rows = []
+    for chunk in ResultStore(path).chunks():
+        with np.load(chunk) as data:
+            row = data['episode']
+        if _match(row[0], filters):
+            rows.append(row)
+    if not rows:
+        return np.zeros(0, dtype=EPISODE_DTYPE)
+    return np.concatenate(rows)
+
+
+def load_steps(path, **filters):
+    """per step metrics of the episodes matching `filters`, see `load_episodes`
+
+    Returns:
+        (ndarray): structured array of STEP_DTYPE, with the episode keys
+            (tracker, env, seed, episode) appended
+    """
+    keys = [('tracker', 'U32'), ('env', 'U64'), ('seed', 'i8'), ('episode', 'i8')]
+    dtype = np.dtype(STEP_DTYPE.descr + keys)
+    tables = []
+    for chunk in ResultStore(path).chunks():
+        with np.load(chunk) as data:
+            row, steps = data['episode'][0], data['steps']
+        if not _match(row, filters):
+            continue
+        table = np.zeros(len(steps), dtype=dtype)
+        for name in STEP_DTYPE.names:
+            table[name] = steps[name]
+        for name, _ in keys:
+            table[name] = row[name]
+        tables.append(table)
+    if not tables:
+        return np.zeros(0, dtype=dtype)
+    return np.concatenate(tables)
+
+
+def aggregate(episodes, by=('tracker', 'env'),
+              metrics=('ar', 'el', 'lost_frames', 'mean_direction_error', 'mean_latency_ms')):
+    """mean and std of `metrics` over episodes grouped by the fields in `by`
+
+    Returns:
+        (list): one dict per group, with the group keys, 'count', and
+            '[metric]_mean', '[metric]_std' of every metric
+    """
+    by = list(by)
+    if len(episodes) == 0:
+        return []
+    groups, inverse = np.unique(episodes[by], return_inverse=True)
+    res = []
+    for i, group in enumerate(groups):
+        rows = episodes[inverse.reshape(-1) == i]
+        item = {k: group[k].item() for k in by}
+        item['count'] = len(rows)
+        for m in metrics:
+            item[f'{m}_mean'] = float(rows[m].mean())
+            item[f'{m}_std'] = float(rows[m].std())
+        res.append(item)
+    return res
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('path', type=str, help='directory of the result store')
+    parser.add_argument('--by', type=str, nargs='+', default=['tracker', 'env'], help='fields to group episodes by')
+    parser.add_argument('--tracker', type=str, nargs='+', default=None, help='only these trackers')
+    parser.add_argument('--env', type=str, nargs='+', default=None, help='only these envs')
+    parser.add_argument('--seed', type=int, nargs='+', default=None, help='only these seeds')
+    args = parser.parse_args()
+
+    filters = {k: getattr(args, k) for k in ['tracker', 'env', 'seed'] if getattr(args, k) is not None}
+    rows = aggregate(load_episodes(args.path, **filters), by=args.by)
+    if not rows:
+        print(f"No episodes found in {args.path}")
+    else:
+        print('\t'.join(rows[0].keys()))
+        for row in rows:
+            print('\t'.join(f'{v:.3f}' if isinstance(v, float) else str(v) for v in row.values()))
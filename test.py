@@ -1,67 +1,235 @@
+import os
 import torch
 import numpy as np
+import time
 import argparse
-from env import create_env
+import multiprocessing as mp
+from concurrent.futures import ThreadPoolExecutor
+from env import create_env, create_replay_env
 from camera import CameraDiscrete
-from trackers import TrackerSiamFC
-from trackers import TrackerTransT
-from utils import show_img, make_video
+from trackers import TRACKERS
+from utils import FrameViewer, VideoRecorder
+from tracker_server import TrackerClient
+from results import ResultStore
+import profiler
 
-def test(env, tracker, camera, args):
+def make_viewer(args, video_name):
+    recorder = None
+    if not args.no_record:
+        recorder = VideoRecorder(video_name, frame_skip=args.video_skip,
+            scale=args.video_scale, threaded=args.video_thread)
+    return FrameViewer(display=not args.headless, recorder=recorder)
+
+def test(env, tracker, camera, args, video_name='./test.mp4'):
+    """
+    Returns:
+        (float): AR, accumulated reward
+        (int): EL, episode length, 0 if not done within max steps
+        (dict): per step 'rewards', 'directions' and 'latencies' (second)
+    """
     ar = 0  # AR, accumulated reward
     el = 0  # EL, episode length
+    log = {'rewards': [], 'directions': [], 'latencies': []}
     _, w, h = env.observation_space.shape
     init_bbox = np.array([-18. + w / 2, -18. + h / 2, 36., 36.])
-    imgs = []
-    
+    viewer = make_viewer(args, video_name)
+
     try:
         state = env.reset()
         tracker.init(state, init_bbox)
-        show_img(state, init_bbox, "init")
+        viewer.show(state, init_bbox, "init", record=False)
         env.start()
 
         for steps in range(args.max_test_steps):
-            bbox = tracker.track(state)
-            action = camera.move(state, bbox)
-            img = show_img(state, bbox, "step")
-            imgs.append(img)
+            tic = time.perf_counter()
+            with profiler.stage('step'):
+                with profiler.stage('tracker'):
+                    bbox = tracker.track(state)
+                with profiler.stage('camera_control'):
+                    action = camera.move(state, bbox)
+                viewer.show(state, bbox, "step")
 
-        # self.unrealcv.start_move(self.target_list[0])
-            state, reward, done, _ = env.step(action)
-            ar += reward
+            # self.unrealcv.start_move(self.target_list[0])
+                with profiler.stage('env_step'):
+                    state, reward, done, info = env.step(action)
+                ar += reward
+            log_step(log, reward, info, tic)
 
             if done:
                 el = steps + 1
                 break
     finally:
         env.close()
-        make_video(imgs, './test.mp4')
+        viewer.close()
+
+    return ar, el, log
+
+
+def log_step(log, reward, info, tic):
+    log['rewards'].append(reward)
+    log['directions'].append(info['Direction'])
+    log['latencies'].append(time.perf_counter() - tic)
+
+def timed_step(env, action):
+    with profiler.stage('env_step'):
+        return env.step(action)
+
+def test_pipelined(env, tracker, camera, args, video_name='./test.mp4'):
+    """same as `test`, but `env.step` runs in a background thread while the
+    tracker processes the latest frame, so the action applied at step t is the
+    one computed from frame t-1 (one frame of extra action latency)
+    """
+    ar = 0  # AR, accumulated reward
+    el = 0  # EL, episode length
+    log = {'rewards': [], 'directions': [], 'latencies': []}
+    _, w, h = env.observation_space.shape
+    init_bbox = np.array([-18. + w / 2, -18. + h / 2, 36., 36.])
+    viewer = make_viewer(args, video_name)
+    print("Pipelined mode: actions lag observations by 1 frame")
+
+    try:
+        state = env.reset()
+        tracker.init(state, init_bbox)
+        viewer.show(state, init_bbox, "init", record=False)
+        env.start()
+        action = camera.move(state, init_bbox)
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            for steps in range(args.max_test_steps):
+                tic = time.perf_counter()
+                with profiler.stage('step'):
+                    # render step t+1 with the previous action while tracking frame t
+                    future = executor.submit(timed_step, env, action)
+                    with profiler.stage('tracker'):
+                        bbox = tracker.track(state)
+                    with profiler.stage('camera_control'):
+                        action = camera.move(state, bbox)
+                    viewer.show(state, bbox, "step")
 
+                    with profiler.stage('env_wait'):
+                        state, reward, done, info = future.result()
+                    ar += reward
+                log_step(log, reward, info, tic)
+
+                if done:
+                    el = steps + 1
+                    break
+    finally:
+        env.close()
+        viewer.close()
+
+    return ar, el, log
+
+
+def run_episode(args, episode_id, port=None, video_name='./test.mp4', launch_lock=None):
+    print(f"Test {episode_id} is running......")
+    record = None
+    if args.record_episode is not None:
+        record = os.path.join(args.record_episode, str(episode_id))
+    if args.replay is not None:
+        env = create_replay_env(args.replay)
+    elif launch_lock is None:
+        env = create_env(args.env, args.seed, port=port, record=record, mock=args.mock_unreal)
+    else:
+        with launch_lock:
+            env = create_env(args.env, args.seed, port=port, record=record, mock=args.mock_unreal)
+    if args.tracker_server is not None:
+        tracker = TrackerClient(args.tracker_server, args.tracker_authkey)
+    else:
+        tracker = TRACKERS[args.tracker](args.model_path)
+    camera = CameraDiscrete(center_ratio=0.2)
+    if args.profile is not None:
+        prof = profiler.enable()
+        if hasattr(env.unwrapped, 'unrealcv'):
+            unrealcv = env.unwrapped.unrealcv
+            prof.instrument(unrealcv.client, 'request', 'env_request')
+            prof.instrument(unrealcv, 'decode_image', 'image_decode')
+    test_fn = test_pipelined if args.pipeline else test
+    try:
+        ar, el, log = test_fn(env, tracker, camera, args, video_name)
+    finally:
+        if args.tracker_server is not None:
+            tracker.close()
+    if args.results is not None:
+        env_name = args.env if args.replay is None else args.replay
+        ResultStore(args.results).append(args.tracker, env_name, args.seed, episode_id, el,
+            max_direction=getattr(env.unwrapped, 'max_direction', None), **log)
+    if args.profile is not None:
+        profile_name = f'{os.path.splitext(args.profile)[0]}_{episode_id}.json'
+        prof.dump(profile_name)
+        profiler.disable()
+        print(f"Profile of test {episode_id} is saved to {profile_name}")
+    print(f"Test {episode_id} finished.")
     return ar, el
 
 
+_worker_port = None
+_launch_lock = None
+
+def _init_worker(port_queue, launch_lock):
+    """give each pool worker its own unreal port, and serialize env launching
+    since all instances share the same unrealcv.ini
+    """
+    global _worker_port, _launch_lock
+    _worker_port = port_queue.get()
+    _launch_lock = launch_lock
+
+def _run_worker_episode(args, episode_id):
+    return run_episode(args, episode_id, _worker_port,
+        f'./test_{episode_id}.mp4', _launch_lock)
+
+def run_parallel(args):
+    """run `args.test_num` episodes on `args.num_workers` unreal instances
+
+    Returns:
+        (list): [(ar, el), ...], in order of episode id
+    """
+    ctx = mp.get_context('spawn')
+    port_queue = ctx.Queue()
+    for i in range(args.num_workers):
+        port_queue.put(args.base_port + i)
+    launch_lock = ctx.Lock()
+    with ctx.Pool(args.num_workers, initializer=_init_worker,
+                  initargs=(port_queue, launch_lock)) as pool:
+        results = pool.starmap(_run_worker_episode,
+            [(args, i) for i in range(args.test_num)], chunksize=1)
+    return results
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('--env', type=str, default='UnrealTrack-GeometryTrackRam-DiscreteColor-v0', help='environment name to use')
     parser.add_argument('--max_test_steps', type=int, default=500, help='max steps for test')
     parser.add_argument('--test_num', type=int, default=int(1), help='test how many times')
+    parser.add_argument('--tracker', type=str, default='siamfc', choices=TRACKERS.keys(), help='tracker to test, also the tracker name saved in results')
     parser.add_argument('--model_path', type=str, help='pretrained model path')
+    parser.add_argument('--seed', type=int, default=1, help='seed of the environment')
+    parser.add_argument('--results', type=str, default=None, help='append per-step and per-episode metrics to this result store, e.g. ./results/store, see results.py')
+    parser.add_argument('--record_episode', type=str, default=None, help='save frames, poses and actions of every test to [record_episode]/[test id]')
+    parser.add_argument('--replay', type=str, default=None, help='replay a recorded episode instead of running unreal')
+    parser.add_argument('--mock_unreal', action='store_true', help='run a local mock UnrealCV server instead of the unreal binary')
+    parser.add_argument('--tracker_server', type=str, default=None, help='unix socket of a running tracker_server.py, instead of loading the model')
+    parser.add_argument('--tracker_authkey', type=str, default=None, help='authkey of the tracker server, default $TRACKER_SERVER_AUTHKEY')
+    parser.add_argument('--num_workers', type=int, default=1, help='number of unreal instances running in parallel')
+    parser.add_argument('--base_port', type=int, default=9000, help='unrealcv port of the first parallel instance')
+    parser.add_argument('--headless', action='store_true', help='do not display frames')
+    parser.add_argument('--no_record', action='store_true', help='do not record video')
+    parser.add_argument('--video_skip', type=int, default=1, help='record one frame out of every video_skip frames')
+    parser.add_argument('--video_scale', type=float, default=1.0, help='resize factor of recorded frames')
+    parser.add_argument('--video_thread', action='store_true', help='encode video in a background thread')
+    parser.add_argument('--profile', type=str, default=None, help='save per-stage latencies of every test to [profile]_[test id].json')
+    parser.add_argument('--pipeline', action='store_true', help='overlap env step with tracking, adds one frame of action latency')
     args = parser.parse_args()
 
-    ars = []
-    els = []
-    for i in range(args.test_num):
-        print(f"Test {i} is running......")
-        env = create_env(args.env)
-        tracker = TrackerSiamFC(args.model_path)
-        # tracker = TrackerTransT(args.model_path)
-        camera = CameraDiscrete(center_ratio=0.2)
-        ar, el = test(env, tracker, camera, args)
-        ars.append(ar)
-        els.append(el)
-        print(f"Test {i} finished.")
+    if args.num_workers > 1:
+        results = run_parallel(args)
+    else:
+        results = [run_episode(args, i) for i in range(args.test_num)]
+    ars = [ar for ar, _ in results]
+    els = [el for _, el in results]
 
     print(f"AR;\tEL")
     for i in range(args.test_num):
         print(f"{ars[i]};\t{els[i]}")
-    
+    print(f"mean: {np.mean(ars)};\t{np.mean(els)}")
+
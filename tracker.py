@@ -29,3 +29,29 @@ class TrackerBase(abc.ABC):
             bbox (numpy array): (4,), [tlx, tly, w, h]
         """
         raise NotImplementedError
+
+    def init_batch(self, imgs, bboxes, seq_ids=None):
+        """initilize several sequences at once, each of them keeps its own state,
+        so that one tracker instance can serve many environments
+
+        Args:
+            imgs (list): N numpy arrays, HxWxC, in BGR
+            bboxes (list): N numpy arrays, (4,), [tlx, tly, w, h]
+            seq_ids (list): N hashable ids of the sequences, default 0..N-1
+
+        Returns:
+            None
+        """
+        raise NotImplementedError
+
+    def track_batch(self, imgs, seq_ids=None):
+        """track several sequences initialized by `init_batch` at once
+
+        Args:
+            imgs (list): N numpy arrays, HxWxC, in BGR
+            seq_ids (list): N ids given to `init_batch`, default 0..N-1
+
+        Returns:
+            bboxes (numpy array): (N, 4), [tlx, tly, w, h]
+        """
+        raise NotImplementedError
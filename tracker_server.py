@@ -0,0 +1,192 @@
+import argparse
+import os
+import queue
+import secrets
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client
+from tracker import TrackerBase
+
+AUTHKEY_ENV = 'TRACKER_SERVER_AUTHKEY'
+
+
+class TrackerServer(object):
+    """own one tracker model and serve many evaluation workers through a unix socket,
+    `track` requests arriving within `max_delay` are batched into one forward pass
+
+    Args:
+        tracker (TrackerBase): tracker implementing `init_batch` and `track_batch`
+        address (str): path of the unix socket
+        max_batch (int): max sequences in one batch
+        max_delay (float): seconds to wait for more requests after the first one
+        authkey (str): secret shared with the clients, default `$TRACKER_SERVER_AUTHKEY`
+    """
+    def __init__(self, tracker, address, max_batch=16, max_delay=0.005, authkey=None):
+        self.tracker = tracker
+        self.address = address
+        self.authkey = _authkey(authkey)
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.requests = queue.Queue()
+        self.free_ids = []  # sequence ids of closed connections, reused by new ones
+        self.next_id = 0
+        self.id_lock = threading.Lock()
+        self.initialized = set()  # sequence ids with a successful init
+
+    def serve_forever(self):
+        threading.Thread(target=self._batch_loop, daemon=True).start()
+        if os.path.exists(self.address):
+            os.remove(self.address)  # stale socket of a previous server
+        # connections unpickle what they receive, so only clients with the authkey are served
+        with Listener(self.address, family='AF_UNIX', authkey=self.authkey) as listener:
+            os.chmod(self.address, 0o600)
+            print(f"Tracker server is listening on {self.address}")
+            while True:
+                try:
+                    conn = listener.accept()
+                except (AuthenticationError, OSError, EOFError) as e:
+                    print(f"Tracker server refused a client: {e!r}")
+                    continue
+                threading.Thread(target=self._handle_client, args=(conn,),
+                                 daemon=True).start()
+
+    def _handle_client(self, conn):
+        with self.id_lock:
+            if self.free_ids:
+                seq_id = self.free_ids.pop()
+            else:
+                seq_id = self.next_id
+                self.next_id += 1
+        try:
+            while True:
+                try:
+                    cmd, args = conn.recv()
+                except EOFError:
+                    break
+                request = {'cmd': cmd, 'args': args, 'seq_id': seq_id,
+                           'done': threading.Event()}
+                self.requests.put(request)
+                request['done'].wait()
+                conn.send((request['ok'], request['result']))
+        finally:
+            conn.close()
+            with self.id_lock:
+                self.initialized.discard(seq_id)
+                self.free_ids.append(seq_id)
+
+    def _batch_loop(self):
+        while True:
+            batch = [self.requests.get()]
+            deadline = time.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.requests.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            # every client waits for its reply, so one batch never holds two
+            # requests of the same sequence
+            inits, tracks = [], []
+            for request in batch:
+                if request['cmd'] == 'init':
+                    self.initialized.discard(request['seq_id'])
+                    inits.append(request)
+                elif request['cmd'] != 'track':
+                    self._reply(request, False, f"unknown command {request['cmd']!r}")
+                elif request['seq_id'] not in self.initialized:
+                    self._reply(request, False, 'track before init')
+                else:
+                    tracks.append(request)
+            if inits:
+                self._run(inits, self._init_batch)
+            if tracks:
+                self._run(tracks, self._track_batch)
+
+    def _init_batch(self, requests):
+        self.tracker.init_batch([r['args'][0] for r in requests],
+                                [r['args'][1] for r in requests],
+                                [r['seq_id'] for r in requests])
+        self.initialized.update(r['seq_id'] for r in requests)
+        return [None] * len(requests)
+
+    def _track_batch(self, requests):
+        return self.tracker.track_batch([r['args'][0] for r in requests],
+                                        [r['seq_id'] for r in requests])
+
+    def _run(self, requests, fn):
+        try:
+            results = fn(requests)
+        except Exception as e:
+            if len(requests) == 1:
+                self._reply(requests[0], False, repr(e))
+                return
+            # one bad request must not fail the others of the batch, run them one by one
+            for request in requests:
+                self._run([request], fn)
+            return
+        for request, result in zip(requests, results):
+            self._reply(request, True, result)
+
+    def _reply(self, request, ok, result):
+        request['ok'] = ok
+        request['result'] = result
+        request['done'].set()
+
+
+class TrackerClient(TrackerBase):
+    """a tracker whose model lives in a `TrackerServer`
+
+    Args:
+        address (str): path of the server's unix socket
+        authkey (str): secret of the server, default `$TRACKER_SERVER_AUTHKEY`
+    """
+    def __init__(self, address, authkey=None):
+        super(TrackerClient, self).__init__()
+        self.conn = Client(address, family='AF_UNIX', authkey=_authkey(authkey))
+
+    def init(self, img, bbox):
+        self._request('init', (img, bbox))
+
+    def track(self, img):
+        return self._request('track', (img,))
+
+    def close(self):
+        self.conn.close()
+
+    def _request(self, cmd, args):
+        self.conn.send((cmd, args))
+        ok, result = self.conn.recv()
+        if not ok:
+            raise RuntimeError(f"tracker server failed on {cmd}: {result}")
+        return result
+
+
+def _authkey(authkey):
+    if authkey is None:
+        authkey = os.environ.get(AUTHKEY_ENV)
+    if not authkey:
+        raise ValueError(f"the tracker server needs an authkey, pass one or set ${AUTHKEY_ENV}")
+    return authkey.encode() if isinstance(authkey, str) else authkey
+
+
+if __name__ == '__main__':
+    from trackers import TRACKERS
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tracker', type=str, default='siamfc', choices=TRACKERS.keys(), help='tracker to serve')
+    parser.add_argument('--model_path', type=str, help='pretrained model path')
+    parser.add_argument('--address', type=str, default='/tmp/tracker.sock', help='unix socket of the server')
+    parser.add_argument('--max_batch', type=int, default=16, help='max sequences in one forward pass')
+    parser.add_argument('--max_delay', type=float, default=0.005, help='seconds to wait for batching requests')
+    parser.add_argument('--authkey', type=str, default=os.environ.get(AUTHKEY_ENV), help=f'secret shared with the clients, default ${AUTHKEY_ENV} or a random one')
+    args = parser.parse_args()
+
+    if not args.authkey:
+        args.authkey = secrets.token_hex(16)
+        print(f"export {AUTHKEY_ENV}={args.authkey}  # for the clients")
+    tracker = TRACKERS[args.tracker](args.model_path)
+    server = TrackerServer(tracker, args.address, args.max_batch, args.max_delay, args.authkey)
+    server.serve_forever()
@@ -1,2 +1,7 @@
 from .siamfc import TrackerSiamFC
-from .transt import TrackerTransT
\ No newline at end of file
+from .transt import TrackerTransT
+
+TRACKERS = {
+    'siamfc': TrackerSiamFC,
+    'transt': TrackerTransT,
+}
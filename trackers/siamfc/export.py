@@ -0,0 +1,72 @@
+import os
+import copy
+import argparse
+import torch
+import torch.nn as nn
+from torch.nn.utils.fusion import fuse_conv_bn_eval
+from .net import NetSiamFC
+from .config import cfg
+
+
+def load_net(model_path, device='cpu'):
+    """加载eager模式的NetSiamFC,推理时不需要再缩放score"""
+    net = NetSiamFC(score_scale=1.0)
+    model_dict = torch.load(model_path, map_location='cpu')
+    if 'model' in model_dict:
+        model_dict = model_dict['model']
+    net.load_state_dict(model_dict)
+    return net.to(device).eval()
+
+def fold_bn(backbone):
+    """把AlexNet中每个Conv2d后的BatchNorm2d合并进卷积的权重,返回新的backbone"""
+    backbone = copy.deepcopy(backbone).eval()
+    for seq in backbone.children():
+        layers = list(seq.children())
+        for i in range(len(layers) - 1):
+            if isinstance(layers[i], nn.Conv2d) and isinstance(layers[i + 1], nn.BatchNorm2d):
+                seq[i] = fuse_conv_bn_eval(layers[i], layers[i + 1])
+                seq[i + 1] = nn.Identity()
+    return backbone
+
+@torch.no_grad()
+def export(net):
+    """合并BN后trace backbone、script head,得到TorchScript的NetSiamFC,
+    backbone和head仍可以单独调用
+
+    Args:
+        net: eval模式的NetSiamFC
+    """
+    net = copy.deepcopy(net).cpu().eval()
+    example = torch.zeros(1, 3, cfg.instance_size, cfg.instance_size)
+    net.backbone = torch.jit.trace(fold_bn(net.backbone), example)
+    net.head = torch.jit.script(net.head)
+    return torch.jit.script(net)
+
+def jit_path(model_path):
+    return model_path + '.jit.pt'
+
+def load_or_export(model_path, device='cpu'):
+    """加载与checkpoint放在一起的TorchScript模型,不存在或比checkpoint旧时重新导出"""
+    path = jit_path(model_path)
+    if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(model_path):
+        torch.jit.save(export(load_net(model_path)), path)
+    return torch.jit.load(path, map_location=device).eval()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('model_path', type=str, help='pretrained model path')
+    args = parser.parse_args()
+
+    net = load_net(args.model_path)
+    jit_net = export(net)
+    torch.jit.save(jit_net, jit_path(args.model_path))
+
+    # 检查导出前后输出一致
+    with torch.no_grad():
+        z = torch.rand(2, 3, cfg.exemplar_size, cfg.exemplar_size) * 255
+        x = torch.rand(2 * cfg.scale_num, 3, cfg.instance_size, cfg.instance_size) * 255
+        scores = net(z, x)
+        diff = (scores - jit_net(z, x)).abs().max() / scores.abs().max()
+    print(f"TorchScript model is saved to {jit_path(args.model_path)}, "
+          f"max relative diff {diff.item():.3g}")
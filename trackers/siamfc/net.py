@@ -18,10 +18,19 @@ class HeadSiamFC(nn.Module):
         self.score_scale = scale
 
     def forward(self, z, x):
-        N, _, H, W = x.shape
-        x = x.reshape(1, -1, H, W)
+        """x可以是每个z的S个搜索图像,按(S, N)的顺序排列,即x[s * N + i]与z[i]计算相关,
+        z在S个搜索图像间广播,不需要复制
+
+        Args:
+            z: NxCxhxw
+            x: (S*N)xCxHxW
+        Returns:
+            scores: (S*N)x1xH'xW'
+        """
+        N, C = z.shape[0], z.shape[1]
+        x = x.reshape(-1, N * C, x.shape[-2], x.shape[-1])
         scores = F.conv2d(x, z, groups=N) * self.score_scale
-        return scores.transpose(0, 1)  # Nx1xHxW
+        return scores.reshape(-1, 1, scores.shape[-2], scores.shape[-1])
 
 class AlexNet(nn.Module):
     """backbone
@@ -0,0 +1,61 @@
+import copy
+import torch
+from torch.ao.quantization import get_default_qconfig_mapping
+from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+from .export import load_net
+
+
+def int8_path(model_path):
+    return model_path + '.int8.pt'
+
+@torch.no_grad()
+def quantize_backbone(backbone, calib_inputs):
+    """FX静态量化AlexNet,conv+bn+relu会先融合,输入输出仍是float
+
+    Args:
+        backbone: eval模式的AlexNet
+        calib_inputs: 校准用的backbone输入, list of Nx3xHxW
+    """
+    backbone = copy.deepcopy(backbone).cpu().eval()
+    prepared = prepare_fx(backbone, get_default_qconfig_mapping(),
+        example_inputs=(calib_inputs[0],))
+    for x in calib_inputs:
+        prepared(x)
+    return convert_fx(prepared)
+
+@torch.no_grad()
+def quantize(net, calib_inputs):
+    """int8的backbone,float的head(两个特征图之间的相关无法量化),script后的NetSiamFC"""
+    net = copy.deepcopy(net).cpu().eval()
+    net.backbone = torch.jit.script(quantize_backbone(net.backbone, calib_inputs))
+    net.head = torch.jit.script(net.head)
+    return torch.jit.script(net)
+
+def quantize_tracker(model_path, frames, init_bbox):
+    """用float跟踪器跑一遍frames,收集backbone的输入来校准,量化后的模型保存在[model_path].int8.pt
+
+    Args:
+        frames: list of HxWxC图片, 第一张用于init
+        init_bbox: [xmin, ymin, w, h]
+    Returns:
+        保存的路径
+    """
+    from .siamfc import TrackerSiamFC
+    tracker = TrackerSiamFC(model_path)
+    calib_inputs = []
+    hook = tracker.net.backbone.register_forward_pre_hook(
+        lambda module, inputs: calib_inputs.append(inputs[0].detach().cpu().clone()))
+    try:
+        tracker.init(frames[0], init_bbox)
+        for frame in frames[1:]:
+            tracker.track(frame)
+    finally:
+        hook.remove()
+
+    path = int8_path(model_path)
+    torch.jit.save(quantize(load_net(model_path), calib_inputs), path)
+    return path
+
+def load_int8(model_path):
+    """加载quantize_tracker保存的int8模型,只能在cpu上运行"""
+    return torch.jit.load(int8_path(model_path), map_location='cpu').eval()
@@ -1,11 +1,15 @@
 import torch
+import torch.nn.functional as F
 import numpy as np
 import cv2
 import time
+import functools
 from  tracker import TrackerBase
-from .net import NetSiamFC
-from .transforms import crop_resize_box, crop_resize_center, to_tensor
+from .export import load_net, load_or_export
+from .quantize import load_int8
+from .transforms import crop_resize_box, crop_resize_centers
 from .config import cfg
+import profiler
 
 
 def crop_and_resize(img, center, size, out_size,
@@ -38,93 +42,181 @@ def crop_and_resize(img, center, size, out_size,
 
     return patch
 
+@functools.lru_cache(maxsize=8)
+def tracking_constants(upscale_size, scale_num, scale_step, scale_penalty, device):
+    """跟踪时用到的常量,按参数缓存,重新init时不需要再计算。返回的tensor是共享的,不要原地修改
+
+    Returns:
+        cos_window: (upscale_size, upscale_size), 二维余弦窗口
+        scale_factors: (scale_num,), 搜索尺寸
+        scale_penalties: (scale_num,), 缩放scale的惩罚
+    """
+    # 二维余弦窗口
+    cos_window = np.outer(np.hanning(upscale_size), np.hanning(upscale_size))
+    cos_window /= cos_window.sum()
+    cos_window = torch.from_numpy(cos_window).float().to(device)
+    # 搜索尺寸
+    scale_exps = np.arange(scale_num) - (scale_num - 1) / 2
+    scale_factors = scale_step**scale_exps
+    # 缩放scale的惩罚,未缩放的没有惩罚
+    scale_penalties = torch.full((scale_num,), scale_penalty, device=device)
+    scale_penalties[scale_num // 2] = 1.
+    return cos_window, scale_factors, scale_penalties
+
 class TrackerSiamFC(TrackerBase):
-    def __init__(self, model_path):
+    """
+    Args:
+        model_path: checkpoint路径
+        jit: 使用合并BN后的TorchScript模型,缓存在[model_path].jit.pt,见export.py
+        int8: 使用int8量化的backbone,只能在cpu上运行,需要先用calibrate.py生成
+            [model_path].int8.pt,见quantize.py
+    """
+    def __init__(self, model_path, jit=False, int8=False):
         super(TrackerSiamFC, self).__init__()
 
-        self.cuda = torch.cuda.is_available()
+        self.cuda = torch.cuda.is_available() and not int8
         self.device = torch.device('cuda:0' if self.cuda else 'cpu')
 
-        self.net = NetSiamFC(score_scale=1.0)  # 推理时不需要再缩放
-        model_dict = torch.load(model_path)
-        if 'model' in model_dict:
-            model_dict = model_dict['model']
-        self.net.load_state_dict(model_dict)
-        self.net = self.net.to(self.device)
-        self.net.eval()
+        if int8:
+            self.net = load_int8(model_path)
+        elif jit:
+            self.net = load_or_export(model_path, self.device)
+        else:
+            self.net = load_net(model_path, self.device)
+
+        self.states = {}  # 每个序列各自的跟踪状态
+        self.crops = None  # 按批大小复用的搜索图像缓冲区,见_crop_buffers
+        self.batch_ids = None  # 上一次track_batch的序列,没变时复用拼好的kernels
 
     @torch.no_grad()
     def init(self, img, bbox):
-        # 二维余弦窗口
-        self.cos_window = np.outer(
-            np.hanning(cfg.upscale_size),
-            np.hanning(cfg.upscale_size)
-        )
-        self.cos_window /= self.cos_window.sum()
-        # 搜索尺寸
-        scale_exps = np.arange(cfg.scale_num) - (cfg.scale_num - 1) / 2
-        self.scale_factors = cfg.scale_step**scale_exps
-
-        self.center = bbox[:2] + bbox[2:] / 2
-        self.target_size = bbox[2:]
-
-        z, self.z_size = crop_resize_box(img, bbox, cfg.context_amount, 
-            cfg.exemplar_size, cfg.exemplar_size)
-        
-        self.x_size = self.z_size / cfg.exemplar_size * cfg.instance_size
-        self.kernel = self.net.backbone(
-            to_tensor(z).to(self.device).unsqueeze(0))
-        self.kernel = self.kernel.repeat(cfg.scale_num, 1, 1, 1)
+        self.init_batch([img], [bbox])
 
     @torch.no_grad()
     def track(self, img):
-        # 多个尺寸的搜索图像合并成一个tensor
-        xs = [crop_resize_center(
-            img, self.center, 
-            (self.x_size * s, self.x_size * s),
-            (cfg.instance_size, cfg.instance_size))
-            for s in self.scale_factors]
-
-        xs = torch.FloatTensor(
-            np.array(xs)).permute(0, 3, 1, 2).to(self.device)
+        return self.track_batch([img])[0]
 
-        xs = self.net.backbone(xs)
-        scores = self.net.head(self.kernel, xs)
-        scores = scores.squeeze(1).cpu().numpy()
+    @torch.no_grad()
+    def init_batch(self, imgs, bboxes, seq_ids=None):
+        if seq_ids is None:
+            seq_ids = range(len(imgs))
+        self.cos_window, self.scale_factors, self.scale_penalties = tracking_constants(
+            cfg.upscale_size, cfg.scale_num, cfg.scale_step, cfg.scale_penalty, self.device)
+
+        zs = []
+        for img, bbox, seq_id in zip(imgs, bboxes, seq_ids):
+            bbox = np.array(bbox, dtype=np.float64)
+            z, z_size = crop_resize_box(img, bbox, cfg.context_amount, 
+                cfg.exemplar_size, cfg.exemplar_size)
+            zs.append(z)
+            self.states[seq_id] = {
+                'center': bbox[:2] + bbox[2:] / 2,
+                'target_size': bbox[2:],
+                'z_size': z_size,
+                'x_size': z_size / cfg.exemplar_size * cfg.instance_size,
+            }
+
+        zs = torch.FloatTensor(
+            np.array(zs)).permute(0, 3, 1, 2).to(self.device)
+        kernels = self.net.backbone(zs)
+        for seq_id, kernel in zip(seq_ids, kernels):
+            self.states[seq_id]['kernel'] = kernel
+        self.batch_ids = None
 
+    @torch.no_grad()
+    def track_batch(self, imgs, seq_ids=None):
+        if seq_ids is None:
+            seq_ids = range(len(imgs))
+        states = [self.states[seq_id] for seq_id in seq_ids]
+        n = len(states)
+        if self.batch_ids != list(seq_ids):
+            self.batch_ids = list(seq_ids)
+            self.kernels = torch.stack([state['kernel'] for state in states])
+
+        # 所有序列的多个尺寸的搜索图像合并成一个tensor,按(scale, 序列)排列,
+        # 这样head中每个kernel可以直接广播到它的各个尺寸上
+        with profiler.stage('tracker_crop'):
+            crops, xs = self._crop_buffers(n * cfg.scale_num)
+            for i, (img, state) in enumerate(zip(imgs, states)):
+                sizes = np.outer(state['x_size'] * self.scale_factors, [1, 1])
+                crop_resize_centers(img, state['center'], sizes,
+                    (cfg.instance_size, cfg.instance_size), out=crops[i::n])
+
+            # 转换类型和维度顺序只拷贝一次
+            xs.copy_(torch.from_numpy(crops).permute(0, 3, 1, 2))
+            xs = xs.to(self.device, non_blocking=True)
+
+        with profiler.stage('tracker_forward'):
+            xs = self.net.backbone(xs)
+            scores = self.net.head(self.kernels, xs)
+
+        with profiler.stage('tracker_postprocess'):
+            scale_ids, peaks = self._find_peaks(scores.float(), n)
+
+            return np.array([self._update_state(state, scale_id, peak)
+                for state, scale_id, peak in zip(states, scale_ids, peaks)])
+
+    def _crop_buffers(self, n):
+        """n张搜索图像的uint8 crop缓冲区和float输入tensor,批大小不变时复用,
+        使用cuda时输入tensor为pinned memory,可以异步拷贝到显存
+        """
+        if self.crops is None or len(self.crops) != n:
+            self.crops = np.empty(
+                (n, cfg.instance_size, cfg.instance_size, 3), dtype=np.uint8)
+            self.xs = torch.empty(
+                (n, 3, cfg.instance_size, cfg.instance_size), pin_memory=self.cuda)
+        return self.crops, self.xs
+
+    def _find_peaks(self, scores, n):
+        """在模型所在设备上批量找响应图的峰值,只把坐标拷回cpu
+
+        Args:
+            scores: (scale_num * n, 1, h, w)
+        Returns:
+            scale_ids: (n,), 每个序列选中的scale
+            peaks: (n,), 峰值在upscale后的响应图中展平的坐标
+        """
         # 三次插值upscale，加上缩放scale的惩罚
-        scores_up = [cv2.resize(score, (cfg.upscale_size, cfg.upscale_size), 
-            interpolation=cv2.INTER_CUBIC) * cfg.scale_penalty for score in scores]
-        scores_up[cfg.scale_num // 2] /= cfg.scale_penalty  # 未缩放的没有惩罚
+        scores_up = F.interpolate(scores, size=(cfg.upscale_size, cfg.upscale_size),
+            mode='bicubic', align_corners=False)
+        scores_up = scores_up.view(
+            cfg.scale_num, n, cfg.upscale_size, cfg.upscale_size).transpose(0, 1)
+        scores_up = scores_up * self.scale_penalties.view(1, -1, 1, 1)
 
         # 归一化后混合余弦窗口惩罚
-        scale_id = np.argmax(np.amax(scores_up, axis=(1, 2)))
-        scores_up = scores_up[scale_id]
-        scores_up -= scores_up.min()
-        scores_up /= scores_up.sum() + 1e-12
+        scale_ids = scores_up.amax(dim=(2, 3)).argmax(dim=1)
+        scores_up = scores_up[torch.arange(n, device=scores_up.device), scale_ids]
+        scores_up = scores_up - scores_up.amin(dim=(1, 2), keepdim=True)
+        scores_up = scores_up / (scores_up.sum(dim=(1, 2), keepdim=True) + 1e-12)
         scores_up = (1 - cfg.window_influence) * scores_up + \
             cfg.window_influence * self.cos_window
 
+        peaks = scores_up.view(n, -1).argmax(dim=1)
+        scale_ids, peaks = torch.stack([scale_ids, peaks]).cpu().numpy()
+        return scale_ids, peaks
+
+    def _update_state(self, state, scale_id, peak):
         # 将最大值对应坐标转换到原图中
-        xy = np.unravel_index(np.argmax(scores_up), scores_up.shape)
+        xy = np.unravel_index(peak, (cfg.upscale_size, cfg.upscale_size))
         xy_in_scoreup = np.array(xy) - (cfg.upscale_size - 1) / 2  # 原点转换到中央
         xy_in_score = xy_in_scoreup / cfg.upscale_size * cfg.score_size
         xy_in_instance = xy_in_score * cfg.stride
-        xy_in_img = xy_in_instance / cfg.instance_size * self.x_size * \
+        xy_in_img = xy_in_instance / cfg.instance_size * state['x_size'] * \
             self.scale_factors[scale_id]
-        self.center += xy_in_img[::-1]  # 注意,img的shape是(h, w)
+        state['center'] += xy_in_img[::-1]  # 注意,img的shape是(h, w)
 
         # 更新scale
         scale = (1 - cfg.scale_lr) * 1. + cfg.scale_lr * \
             self.scale_factors[scale_id]
-        self.z_size *= scale
-        self.x_size *= scale
-        self.target_size *= scale
+        state['z_size'] *= scale
+        state['x_size'] *= scale
+        state['target_size'] *= scale
 
+        center, target_size = state['center'], state['target_size']
         bbox = np.array([
-            self.center[0] - (self.target_size[0] - 1) / 2,
-            self.center[1] - (self.target_size[1] - 1) / 2,
-            self.target_size[0], self.target_size[1]
+            center[0] - (target_size[0] - 1) / 2,
+            center[1] - (target_size[1] - 1) / 2,
+            target_size[0], target_size[1]
         ])
 
         return bbox
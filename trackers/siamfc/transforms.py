@@ -54,6 +54,38 @@ def crop_resize_center(img, center, size, out_size):
     new_img = cv2.resize(new_img, out_size)
     return new_img
 
+def crop_resize_centers(img, center, sizes, out_size, out=None):
+    """给定中心crop多个尺寸并resize,用平均值填充,结果与多次调用crop_resize_center相同
+    (插值精度除外)。每个尺寸只做一次warpAffine,不需要对整张图padding,均值也只算一次
+
+    Args:
+        center: (x, y)
+        sizes: (n, 2), 每行为(w, h)
+        out_size: (w, h)
+        out: (n, h, w, c)的uint8数组,预分配的输出,为None时新建
+    Returns:
+        out: 裁切缩放后的n张图片
+    """
+    sizes = np.asarray(sizes, dtype=np.float64)
+    out_w, out_h = out_size
+    if out is None:
+        out = np.empty((len(sizes), out_h, out_w, img.shape[2]), dtype=np.uint8)
+    border_value = cv2.mean(img)
+    # 与crop_resize_center取整后的裁切区域一致
+    tl = np.floor(np.asarray(center) - (sizes - 1) / 2)
+    br = np.floor(np.asarray(center) - (sizes - 1) / 2 + sizes)
+    for i in range(len(sizes)):
+        # 输出像素到原图的映射,与cv2.resize的像素中心对齐方式相同
+        sx = (br[i, 0] - tl[i, 0]) / out_w
+        sy = (br[i, 1] - tl[i, 1]) / out_h
+        M = np.array([
+            [sx, 0, tl[i, 0] + 0.5 * sx - 0.5],
+            [0, sy, tl[i, 1] + 0.5 * sy - 0.5]])
+        cv2.warpAffine(img, M, (out_w, out_h), dst=out[i],
+            flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP,
+            borderMode=cv2.BORDER_CONSTANT, borderValue=border_value)
+    return out
+
 def to_tensor(img):
     return torch.FloatTensor(img).permute(2, 0, 1)
 
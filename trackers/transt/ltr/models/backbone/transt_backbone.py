@@ -9,7 +9,7 @@ from torch import nn
 from typing import Dict, List
 import ltr.models.backbone as backbones
 
-from util.misc import NestedTensor
+from util.misc import NestedTensor, zero_mask, is_zero_mask
 
 from ltr.models.neck.position_encoding import build_position_encoding
 
@@ -66,7 +66,10 @@ class BackboneBase(nn.Module):
         for name, x in xs.items():
             m = tensor_list.mask
             assert m is not None
-            mask = F.interpolate(m[None].float(), size=x.shape[-2:]).to(torch.bool)[0]
+            if is_zero_mask(m):
+                mask = zero_mask((m.shape[0],) + x.shape[-2:], m.device)
+            else:
+                mask = F.interpolate(m[None].float(), size=x.shape[-2:]).to(torch.bool)[0]
             out[name] = NestedTensor(x, mask)
         return out
 
@@ -38,23 +38,55 @@ class FeatureFusionNetwork(nn.Module):
                 nn.init.xavier_uniform_(p)
 
     def forward(self, src_temp, mask_temp, src_search, mask_search, pos_temp, pos_search):
+        template = self.prepare_template(src_temp, mask_temp, pos_temp)
+        return self.fuse(template, src_search, mask_search, pos_search)
+
+    def prepare_template(self, src_temp, mask_temp, pos_temp):
+        """ The template-only part of the fusion, it can be reused for every search region.
+        Returns (src, mask, pos): the template features of shape [HW x N x C] after the self-attention
+        of the first layer, the mask of shape [N x HW] and the positional encoding of shape [HW x N x C].
+        """
         src_temp = src_temp.flatten(2).permute(2, 0, 1)
         pos_temp = pos_temp.flatten(2).permute(2, 0, 1)
+        mask_temp = mask_temp.flatten(1)
+        src_temp = self.encoder.layers[0].self_attend1(src_temp, src1_key_padding_mask=mask_temp,
+                                                       pos_src1=pos_temp)
+        return src_temp, mask_temp, pos_temp
+
+    def fuse(self, template, src_search, mask_search, pos_search, num_layers: Optional[int] = None):
+        """ template: (src, mask, pos) returned by `prepare_template`
+        num_layers: only run the first num_layers fusion layers, all of them by default
+        """
+        if num_layers is None:
+            num_layers = self.encoder.num_layers
+        return next(self.fuse_stages(template, src_search, mask_search, pos_search, [num_layers]))
+
+    def fuse_stages(self, template, src_search, mask_search, pos_search, depths):
+        """ Decodes the fused features after every number of fusion layers in depths (ascending),
+        e.g. to exit early. The output at each depth is the same as `fuse` with num_layers=depth.
+        """
+        src_temp, mask_temp, pos_temp = template
         src_search = src_search.flatten(2).permute(2, 0, 1)
         pos_search = pos_search.flatten(2).permute(2, 0, 1)
-        mask_temp = mask_temp.flatten(1)
         mask_search = mask_search.flatten(1)
 
-        memory_temp, memory_search = self.encoder(src1=src_temp, src2=src_search,
-                                                  src1_key_padding_mask=mask_temp,
-                                                  src2_key_padding_mask=mask_search,
-                                                  pos_src1=pos_temp,
-                                                  pos_src2=pos_search)
-        hs = self.decoder(memory_search, memory_temp,
-                          tgt_key_padding_mask=mask_search,
-                          memory_key_padding_mask=mask_temp,
-                          pos_enc=pos_temp, pos_dec=pos_search)
-        return hs.unsqueeze(0).transpose(1, 2)
+        memory_temp, memory_search = src_temp, src_search
+        start = 0
+        for end in depths:
+            assert start < end <= self.encoder.num_layers
+            memory_temp, memory_search = self.encoder(src1=memory_temp, src2=memory_search,
+                                                      src1_key_padding_mask=mask_temp,
+                                                      src2_key_padding_mask=mask_search,
+                                                      pos_src1=pos_temp,
+                                                      pos_src2=pos_search,
+                                                      src1_attended=start == 0,
+                                                      start=start, end=end)
+            start = end
+            hs = self.decoder(memory_search, memory_temp,
+                              tgt_key_padding_mask=mask_search,
+                              memory_key_padding_mask=mask_temp,
+                              pos_enc=pos_temp, pos_dec=pos_search)
+            yield hs.unsqueeze(0).transpose(1, 2)
 
 
 class Decoder(nn.Module):
@@ -98,16 +130,22 @@ class Encoder(nn.Module):
                 src1_key_padding_mask: Optional[Tensor] = None,
                 src2_key_padding_mask: Optional[Tensor] = None,
                 pos_src1: Optional[Tensor] = None,
-                pos_src2: Optional[Tensor] = None):
+                pos_src2: Optional[Tensor] = None,
+                src1_attended: bool = False,
+                start: int = 0,
+                end: Optional[int] = None):
+        # src1_attended: src1 already went through the self-attention of the first layer
+        # start, end: only run layers[start:end]
         output1 = src1
         output2 = src2
 
-        for layer in self.layers:
+        for i, layer in enumerate(self.layers[start:end]):
             output1, output2 = layer(output1, output2, src1_mask=src1_mask,
                                      src2_mask=src2_mask,
                                      src1_key_padding_mask=src1_key_padding_mask,
                                      src2_key_padding_mask=src2_key_padding_mask,
-                                     pos_src1=pos_src1, pos_src2=pos_src2)
+                                     pos_src1=pos_src1, pos_src2=pos_src2,
+                                     src1_attended=src1_attended and i == 0)
 
         return output1, output2
 
@@ -202,18 +240,26 @@ class FeatureFusionLayer(nn.Module):
     def with_pos_embed(self, tensor, pos: Optional[Tensor]):
         return tensor if pos is None else tensor + pos
 
-    def forward_post(self, src1, src2,
+    def self_attend1(self, src1,
                      src1_mask: Optional[Tensor] = None,
-                     src2_mask: Optional[Tensor] = None,
                      src1_key_padding_mask: Optional[Tensor] = None,
-                     src2_key_padding_mask: Optional[Tensor] = None,
-                     pos_src1: Optional[Tensor] = None,
-                     pos_src2: Optional[Tensor] = None):
+                     pos_src1: Optional[Tensor] = None):
         q1 = k1 = self.with_pos_embed(src1, pos_src1)
         src12 = self.self_attn1(q1, k1, value=src1, attn_mask=src1_mask,
                                key_padding_mask=src1_key_padding_mask)[0]
         src1 = src1 + self.dropout11(src12)
-        src1 = self.norm11(src1)
+        return self.norm11(src1)
+
+    def forward_post(self, src1, src2,
+                     src1_mask: Optional[Tensor] = None,
+                     src2_mask: Optional[Tensor] = None,
+                     src1_key_padding_mask: Optional[Tensor] = None,
+                     src2_key_padding_mask: Optional[Tensor] = None,
+                     pos_src1: Optional[Tensor] = None,
+                     pos_src2: Optional[Tensor] = None,
+                     src1_attended: bool = False):
+        if not src1_attended:
+            src1 = self.self_attend1(src1, src1_mask, src1_key_padding_mask, pos_src1)
 
         q2 = k2 = self.with_pos_embed(src2, pos_src2)
         src22 = self.self_attn2(q2, k2, value=src2, attn_mask=src2_mask,
@@ -251,10 +297,12 @@ class FeatureFusionLayer(nn.Module):
                 src1_key_padding_mask: Optional[Tensor] = None,
                 src2_key_padding_mask: Optional[Tensor] = None,
                 pos_src1: Optional[Tensor] = None,
-                pos_src2: Optional[Tensor] = None):
+                pos_src2: Optional[Tensor] = None,
+                src1_attended: bool = False):
 
         return self.forward_post(src1, src2, src1_mask, src2_mask,
-                                 src1_key_padding_mask, src2_key_padding_mask, pos_src1, pos_src2)
+                                 src1_key_padding_mask, src2_key_padding_mask, pos_src1, pos_src2,
+                                 src1_attended)
 
 
 def _get_clones(module, N):
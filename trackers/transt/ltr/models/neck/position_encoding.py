@@ -6,7 +6,10 @@ import math
 import torch
 from torch import nn
 
-from util.misc import NestedTensor
+from util.misc import NestedTensor, TensorCache, is_zero_mask
+
+
+_sine_cache = TensorCache()
 
 
 class PositionEmbeddingSine(nn.Module):
@@ -29,6 +32,14 @@ class PositionEmbeddingSine(nn.Module):
         x = tensor_list.tensors
         mask = tensor_list.mask
         assert mask is not None
+        if is_zero_mask(mask):
+            # without padding the encoding only depends on the shape, e.g. 32x32 for every search region
+            key = (self.num_pos_feats, self.temperature, self.normalize, self.scale,
+                   tuple(mask.shape), x.dtype, x.device)
+            return _sine_cache.get(key, lambda: self.encode(mask, x.device).to(x.dtype))
+        return self.encode(mask, x.device)
+
+    def encode(self, mask, device):
         not_mask = ~mask
         y_embed = not_mask.cumsum(1, dtype=torch.float32)
         x_embed = not_mask.cumsum(2, dtype=torch.float32)
@@ -36,7 +47,7 @@ class PositionEmbeddingSine(nn.Module):
             eps = 1e-6
             y_embed = y_embed / (y_embed[:, -1:, :] + eps) * self.scale
             x_embed = x_embed / (x_embed[:, :, -1:] + eps) * self.scale
-        dim_t = torch.arange(self.num_pos_feats, dtype=torch.float32, device=x.device)
+        dim_t = torch.arange(self.num_pos_feats, dtype=torch.float32, device=device)
         dim_t = self.temperature ** (2 * (dim_t // 2) / self.num_pos_feats)
         pos_x = x_embed[:, :, :, None] / dim_t
         pos_y = y_embed[:, :, :, None] / dim_t
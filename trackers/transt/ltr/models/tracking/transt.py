@@ -63,29 +63,53 @@ class TransT(nn.Module):
         out = {'pred_logits': outputs_class[-1], 'pred_boxes': outputs_coord[-1]}
         return out
 
-    def track(self, search):
+    def track(self, search, template=None, num_layers=None, exit_score=None):
+        """ template: returned by `template`, the last template is used if None
+            num_layers: run only the first num_layers feature fusion layers, all of them if None
+            exit_score: decode after every fusion layer and stop once the highest foreground
+                        probability of every sample reaches exit_score
+        """
         if not isinstance(search, NestedTensor):
             search = nested_tensor_from_tensor_2(search)
         features_search, pos_search = self.backbone(search)
-        feature_template = self.zf
-        pos_template = self.pos_template
+        if template is None:
+            template = self.cached_template
         src_search, mask_search= features_search[-1].decompose()
         assert mask_search is not None
-        src_template, mask_template = feature_template[-1].decompose()
-        assert mask_template is not None
-        hs = self.featurefusion_network(self.input_proj(src_template), mask_template, self.input_proj(src_search), mask_search, pos_template[-1], pos_search[-1])
+        src_search = self.input_proj(src_search)
+        if exit_score is None:
+            hs = self.featurefusion_network.fuse(template, src_search, mask_search, pos_search[-1], num_layers)
+            return self._predict(hs)
+
+        if num_layers is None:
+            num_layers = self.featurefusion_network.encoder.num_layers
+        stages = self.featurefusion_network.fuse_stages(template, src_search, mask_search, pos_search[-1],
+                                                        range(1, num_layers + 1))
+        for hs in stages:
+            out = self._predict(hs)
+            if out['pred_logits'].softmax(-1)[..., 0].max(dim=1)[0].min() >= exit_score:
+                break
+        return out
 
+    def _predict(self, hs):
         outputs_class = self.class_embed(hs)
         outputs_coord = self.bbox_embed(hs).sigmoid()
         out = {'pred_logits': outputs_class[-1], 'pred_boxes': outputs_coord[-1]}
         return out
 
     def template(self, z):
+        """ Computes everything of the template that `track` needs, the projected features,
+        the mask and positional encoding in sequence layout, see `FeatureFusionNetwork.prepare_template`.
+        The result is also kept for `track` calls without a template.
+        """
         if not isinstance(z, NestedTensor):
             z = nested_tensor_from_tensor_2(z)
         zf, pos_template = self.backbone(z)
-        self.zf = zf
-        self.pos_template = pos_template
+        src_template, mask_template = zf[-1].decompose()
+        assert mask_template is not None
+        self.cached_template = self.featurefusion_network.prepare_template(
+            self.input_proj(src_template), mask_template, pos_template[-1])
+        return self.cached_template
 
 class SetCriterion(nn.Module):
     """ This class computes the loss for TransT.
@@ -220,7 +244,8 @@ class MLP(nn.Module):
 
 
 @model_constructor
-def transt_resnet50(settings):
+def transt_resnet50(settings, device=None):
+    """ device: overrides settings.device, e.g. to load a network trained on GPU on a CPU-only host """
     num_classes = 1
     backbone_net = build_backbone(settings, backbone_pretrained=True)
     featurefusion_network = build_featurefusion_network(settings)
@@ -229,7 +254,7 @@ def transt_resnet50(settings):
         featurefusion_network,
         num_classes=num_classes
     )
-    device = torch.device(settings.device)
+    device = torch.device(settings.device if device is None else device)
     model.to(device)
     return model
 
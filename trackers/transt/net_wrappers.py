@@ -1,12 +1,20 @@
+import torch
 from .ltr.admin import loading as ltr_loading
+from .quantize import load_int8
 
 class NetWrapper:
     """Used for wrapping networks in pytracking.
-    Network modules and functions can be accessed directly as if they were members of this class."""
+    Network modules and functions can be accessed directly as if they were members of this class.
+    The network is loaded on `device`, which defaults to the GPU if use_gpu else the CPU.
+    With int8=True the network quantized by `quantize.quantize_tracker` is loaded, on CPU."""
     _rec_iter=0
-    def __init__(self, net_path, use_gpu=True, initialize=False, **kwargs):
+    def __init__(self, net_path, use_gpu=True, initialize=False, int8=False, device=None, **kwargs):
         self.net_path = net_path
-        self.use_gpu = use_gpu
+        if device is None:
+            device = 'cuda' if use_gpu and not int8 else 'cpu'
+        self.device = torch.device(device)
+        self.use_gpu = self.device.type == 'cuda'
+        self.int8 = int8
         self.net = None
         self.net_kwargs = kwargs
         if initialize:
@@ -27,9 +35,11 @@ class NetWrapper:
 
     def load_network(self):
         print("========Loading network: ", self.net_path)
-        self.net, _ = ltr_loading.load_network(self.net_path, **self.net_kwargs)
-        if self.use_gpu:
-            self.cuda()
+        if self.int8:
+            self.net = load_int8(self.net_path)
+        else:
+            self.net, _ = ltr_loading.load_network(self.net_path, device=self.device, **self.net_kwargs)
+        self.net.to(self.device)
         self.eval()
 
     def initialize(self):
@@ -39,14 +49,14 @@ class NetWrapper:
 class NetWithBackbone(NetWrapper):
     """Wraps a network."""
 
-    def __init__(self, net_path, use_gpu=True, initialize=False, **kwargs):
-        super().__init__(net_path, use_gpu, initialize, **kwargs)
+    def __init__(self, net_path, use_gpu=True, initialize=False, int8=False, device=None, **kwargs):
+        super().__init__(net_path, use_gpu, initialize, int8, device, **kwargs)
 
     def initialize(self):
         super().initialize()
 
     def template(self, z):
-        self.net.template(z)
+        return self.net.template(z)
 
-    def track(self, image):
-        return self.net.track(image)
\ No newline at end of file
+    def track(self, image, template=None, num_layers=None, exit_score=None):
+        return self.net.track(image, template, num_layers, exit_score)
\ No newline at end of file
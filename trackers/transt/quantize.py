@@ -0,0 +1,117 @@
+import io
+import copy
+import torch
+import torch.nn as nn
+from torch.ao.quantization import (get_default_qconfig, get_default_qconfig_mapping,
+                                   QuantWrapper, prepare, convert, quantize_dynamic)
+from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+
+class _Body(nn.Module):
+    """ResNet body with its output layers fixed, so that FX traces them as a constant"""
+    def __init__(self, body):
+        super().__init__()
+        self.body = body
+
+    def forward(self, x):
+        return self.body(x, self.body.output_layers)
+
+
+_QUANTIZED = ['backbone.0.body', 'input_proj', 'class_embed', 'bbox_embed']
+
+def int8_path(net_path):
+    return net_path + '.int8.pt'
+
+@torch.no_grad()
+def quantize(net, body_inputs, proj_inputs):
+    """quantize the TransT network for CPU inference:
+    the ResNet body is statically quantized with FX (conv+bn+relu and add+relu fused),
+    `input_proj` is statically quantized, and the `class_embed`/`bbox_embed` MLPs are
+    dynamically quantized. The feature fusion network stays in float.
+
+    args:
+        net: TransT network in eval mode
+        body_inputs: list of normalized image batches fed to the ResNet body, for calibration
+        proj_inputs: list of backbone features fed to `input_proj`, for calibration
+    returns:
+        quantized copy of the network on CPU
+    """
+    net = copy.deepcopy(net).cpu().eval()
+    backbone = net.backbone[0]
+    body = prepare_fx(_Body(backbone.body), get_default_qconfig_mapping(),
+                      example_inputs=(body_inputs[0],))
+    for x in body_inputs:
+        body(x)
+    backbone.body = convert_fx(body)
+
+    input_proj = QuantWrapper(net.input_proj)
+    input_proj.qconfig = get_default_qconfig()
+    prepare(input_proj, inplace=True)
+    for x in proj_inputs:
+        input_proj(x)
+    net.input_proj = convert(input_proj, inplace=True)
+
+    net.class_embed = quantize_dynamic(net.class_embed, {nn.Linear}, dtype=torch.qint8)
+    net.bbox_embed = quantize_dynamic(net.bbox_embed, {nn.Linear}, dtype=torch.qint8)
+    return net
+
+def quantize_tracker(net_path, frames, init_bbox):
+    """run the float tracker over `frames` to collect calibration inputs, then save
+    the quantized network to [net_path].int8.pt
+
+    args:
+        frames: list of HxWxC images, the first one is used for initialization
+        init_bbox: [xmin, ymin, w, h]
+    returns:
+        path of the quantized network
+    """
+    from .transt import TrackerTransT
+    tracker = TrackerTransT(net_path)
+    tracker.tracker.initialize_features()
+    net = tracker.tracker.net.net
+    body_inputs, proj_inputs = [], []
+    hooks = [
+        net.backbone[0].body.register_forward_pre_hook(
+            lambda module, inputs: body_inputs.append(inputs[0].detach().cpu())),
+        net.input_proj.register_forward_pre_hook(
+            lambda module, inputs: proj_inputs.append(inputs[0].detach().cpu())),
+    ]
+    try:
+        tracker.init(frames[0], init_bbox)
+        for frame in frames[1:]:
+            tracker.track(frame)
+    finally:
+        for hook in hooks:
+            hook.remove()
+
+    path = int8_path(net_path)
+    save_int8(quantize(net, body_inputs, proj_inputs), path)
+    return path
+
+def save_int8(net, path):
+    # quantized modules can not be reliably unpickled, so they are saved as
+    # TorchScript and only the float rest of the network is pickled
+    modules = {name: net.get_submodule(name) for name in _QUANTIZED}
+    scripts = {}
+    for name, module in modules.items():
+        buffer = io.BytesIO()
+        torch.jit.save(torch.jit.script(module), buffer)
+        scripts[name] = buffer.getvalue()
+        _set_submodule(net, name, None)
+    try:
+        torch.save({'net': net, 'scripts': scripts}, path)
+    finally:
+        for name, module in modules.items():
+            _set_submodule(net, name, module)
+
+def load_int8(net_path):
+    """load the network saved by `quantize_tracker`, it runs on CPU only"""
+    checkpoint = torch.load(int8_path(net_path), map_location='cpu', weights_only=False)
+    net = checkpoint['net']
+    for name, script in checkpoint['scripts'].items():
+        _set_submodule(net, name, torch.jit.load(io.BytesIO(script), map_location='cpu'))
+    return net.eval()
+
+def _set_submodule(net, name, module):
+    parent, _, attr = name.rpartition('.')
+    setattr(net.get_submodule(parent), attr, module)
@@ -2,35 +2,52 @@ from __future__ import absolute_import
 
 import numpy as np
 import math
-import torchvision.transforms.functional as tvisf
 import cv2
 import torch
 import torch.nn.functional as F
 import time
+import profiler
 
 
 class TransT(object):
 
-    def __init__(self, name, net, window_penalty=0.49, exemplar_size=128, instance_size=256):
+    def __init__(self, name, net, window_penalty=0.49, exemplar_size=128, instance_size=256, device=None,
+                 fusion_layers=None, exit_score=None):
         self.name = name
         self.net = net
         self.window_penalty = window_penalty
         self.exemplar_size = exemplar_size
         self.instance_size = instance_size
+        self.fusion_layers = fusion_layers
+        self.exit_score = exit_score
         self.net = self.net
+        if device is None:
+            device = getattr(net, 'device', 'cuda' if torch.cuda.is_available() else 'cpu')
+        self.device = torch.device(device)
+        # (x / 255 - mean) / std folded into a single x * scale + shift
+        mean = torch.tensor([0.485, 0.456, 0.406]).view(1, 3, 1, 1)
+        std = torch.tensor([0.229, 0.224, 0.225]).view(1, 3, 1, 1)
+        self.norm_scale = (1.0 / (255.0 * std)).to(self.device)
+        self.norm_shift = (-mean / std).to(self.device)
+        hanning = np.hanning(32)
+        self.window = torch.from_numpy(np.outer(hanning, hanning).flatten()).float().to(self.device)
+        self.buffers = {}
+        self.states = {}
+        self.batch_ids = None
 
-    def _convert_score(self, score):
-
-        score = score.permute(2, 1, 0).contiguous().view(2, -1).permute(1, 0)
-        score = F.softmax(score, dim=1).data[:, 0].cpu().numpy()
-        return score
-
-    def _convert_bbox(self, delta):
-
-        delta = delta.permute(2, 1, 0).contiguous().view(4, -1)
-        delta = delta.data.cpu().numpy()
+    def _select_best(self, outputs):
+        """window penalty and the best box of every sequence, computed on the device
 
-        return delta
+        returns:
+            numpy array of N x 5, the best box (cx, cy, w, h) relative to the search region
+            and its penalized score
+        """
+        score = F.softmax(outputs['pred_logits'].float(), dim=2)[:, :, 0]
+        pscore = score * (1 - self.window_penalty) + self.window * self.window_penalty
+        best_score, best_idx = pscore.max(dim=1)
+        boxes = outputs['pred_boxes'].float()
+        best_box = boxes[torch.arange(boxes.shape[0], device=boxes.device), best_idx]
+        return torch.cat([best_box, best_score[:, None]], dim=1).cpu().numpy()
 
     def _bbox_clip(self, cx, cy, width, height, boundary):
         cx = max(0, min(cx, boundary[1]))
@@ -47,6 +64,8 @@ class TransT(object):
             model_sz: exemplar size
             original_sz: original size
             avg_chans: channel average
+        returns:
+            uint8 HxWxC patch of model_sz, see `_to_tensor`
         """
         if isinstance(pos, float):
             pos = [pos, pos]
@@ -90,13 +109,21 @@ class TransT(object):
 
         if not np.array_equal(model_sz, original_sz):
             im_patch = cv2.resize(im_patch, (model_sz, model_sz))
-        im_patch = im_patch.transpose(2, 0, 1)
-        im_patch = im_patch[np.newaxis, :, :, :]
-        im_patch = im_patch.astype(np.float32)
-        im_patch = torch.from_numpy(im_patch)
-        im_patch = im_patch.cuda()
         return im_patch
 
+    def _to_tensor(self, patches):
+        """stack uint8 patches into a normalized Nx3xHxW float tensor on the device.
+        The patches are copied as uint8 (through pinned memory on GPU) and converted there.
+        """
+        shape = (len(patches),) + patches[0].shape
+        if shape not in self.buffers:
+            buffer = torch.empty(shape, dtype=torch.uint8, pin_memory=self.device.type == 'cuda')
+            self.buffers[shape] = (buffer, buffer.numpy())
+        buffer, array = self.buffers[shape]
+        for i, patch in enumerate(patches):
+            np.copyto(array[i], patch)
+        x = buffer.to(self.device, non_blocking=True).permute(0, 3, 1, 2).float()
+        return torch.addcmul(self.norm_shift, x, self.norm_scale)
 
 
     def initialize_features(self):
@@ -106,70 +133,101 @@ class TransT(object):
 
     def initialize(self, image, info: dict) -> dict:
         tic = time.time()
-        hanning = np.hanning(32)
-        window = np.outer(hanning, hanning)
-        self.window = window.flatten()
+        self.initialize_batch([image], [info['init_bbox']])
+        out = {'time': time.time() - tic}
+        return out
+
+    def track(self, image, info: dict = None) -> dict:
+        return self.track_batch([image])[0]
+
+    @torch.no_grad()
+    def initialize_batch(self, images, bboxes, seq_ids=None):
+        """initialize several sequences, each of them keeps its own state and template"""
+        if seq_ids is None:
+            seq_ids = list(range(len(images)))
         # Initialize
         self.initialize_features()
-        bbox = info['init_bbox']
-        self.center_pos = np.array([bbox[0] + bbox[2] / 2,
-                                    bbox[1] + bbox[3] / 2])
-        self.size = np.array([bbox[2], bbox[3]])
 
-        # calculate z crop size
-        w_z = self.size[0] + (2 - 1) * ((self.size[0] + self.size[1]) * 0.5)
-        h_z = self.size[1] + (2 - 1) * ((self.size[0] + self.size[1]) * 0.5)
-        s_z = math.ceil(math.sqrt(w_z * h_z))
+        z_crops = []
+        for image, bbox, seq_id in zip(images, bboxes, seq_ids):
+            state = {}
+            state['center_pos'] = np.array([bbox[0] + bbox[2] / 2,
+                                            bbox[1] + bbox[3] / 2])
+            state['size'] = np.array([bbox[2], bbox[3]])
 
-        # calculate channle average
-        self.channel_average = np.mean(image, axis=(0, 1))
+            # calculate z crop size
+            w_z = state['size'][0] + (2 - 1) * ((state['size'][0] + state['size'][1]) * 0.5)
+            h_z = state['size'][1] + (2 - 1) * ((state['size'][0] + state['size'][1]) * 0.5)
+            s_z = math.ceil(math.sqrt(w_z * h_z))
 
-        # get crop
-        z_crop = self.get_subwindow(image, self.center_pos,
-                                    self.exemplar_size,
-                                    s_z, self.channel_average)
+            # calculate channle average
+            state['channel_average'] = np.mean(image, axis=(0, 1))
+
+            # get crop
+            z_crops.append(self.get_subwindow(image, state['center_pos'],
+                                              self.exemplar_size,
+                                              s_z, state['channel_average']))
+            self.states[seq_id] = state
 
         # normalize
-        z_crop = z_crop.float().mul(1.0 / 255.0).clamp(0.0, 1.0)
-        self.mean = [0.485, 0.456, 0.406]
-        self.std = [0.229, 0.224, 0.225]
-        self.inplace = False
-        z_crop[0] = tvisf.normalize(z_crop[0], self.mean, self.std, self.inplace)
-
-        # initialize template feature
-        self.net.template(z_crop)
-        out = {'time': time.time() - tic}
-        return out
+        z_crop = self._to_tensor(z_crops)
 
-    def track(self, image, info: dict = None) -> dict:
-        # calculate x crop size
-        w_x = self.size[0] + (4 - 1) * ((self.size[0] + self.size[1]) * 0.5)
-        h_x = self.size[1] + (4 - 1) * ((self.size[0] + self.size[1]) * 0.5)
-        s_x = math.ceil(math.sqrt(w_x * h_x))
+        # initialize template feature, and keep a copy for every sequence
+        template = self.net.template(z_crop)
+        for i, seq_id in enumerate(seq_ids):
+            self.states[seq_id]['template'] = _select(template, i)
+        self.batch_ids = None
 
-        # get crop
-        x_crop = self.get_subwindow(image, self.center_pos,
-                                    self.instance_size,
-                                    round(s_x), self.channel_average)
+    @torch.no_grad()
+    def track_batch(self, images, seq_ids=None):
+        """track several sequences initialized by `initialize_batch`
 
-        # normalize
-        x_crop = x_crop.float().mul(1.0 / 255.0).clamp(0.0, 1.0)
-        x_crop[0] = tvisf.normalize(x_crop[0], self.mean, self.std, self.inplace)
+        returns:
+            list of dict, same as `track` for every sequence
+        """
+        if seq_ids is None:
+            seq_ids = list(range(len(images)))
+        states = [self.states[seq_id] for seq_id in seq_ids]
+        # reuse the stacked template features until the batch changes
+        if self.batch_ids != list(seq_ids):
+            self.batch_ids = list(seq_ids)
+            self.batch_template = _cat_templates(
+                [state['template'] for state in states])
+
+        with profiler.stage('tracker_crop'):
+            x_crops = []
+            s_xs = []
+            for image, state in zip(images, states):
+                # calculate x crop size
+                w_x = state['size'][0] + (4 - 1) * ((state['size'][0] + state['size'][1]) * 0.5)
+                h_x = state['size'][1] + (4 - 1) * ((state['size'][0] + state['size'][1]) * 0.5)
+                s_x = math.ceil(math.sqrt(w_x * h_x))
+                s_xs.append(s_x)
+
+                # get crop
+                x_crops.append(self.get_subwindow(image, state['center_pos'],
+                                                  self.instance_size,
+                                                  round(s_x), state['channel_average']))
+
+            # normalize
+            x_crop = self._to_tensor(x_crops)
 
         # track
-        outputs = self.net.track(x_crop)
-        score = self._convert_score(outputs['pred_logits'])
-        pred_bbox = self._convert_bbox(outputs['pred_boxes'])
-
-        # window penalty
-        pscore = score * (1 - self.window_penalty) + \
-                 self.window * self.window_penalty
-
-        best_idx = np.argmax(pscore)
-        bbox = pred_bbox[:, best_idx]
+        with profiler.stage('tracker_forward'):
+            outputs = self.net.track(x_crop, self.batch_template,
+                                     num_layers=self.fusion_layers, exit_score=self.exit_score)
+
+        with profiler.stage('tracker_postprocess'):
+            best = self._select_best(outputs)
+            outs = []
+            for image, state, s_x, row in zip(images, states, s_xs, best):
+                outs.append(self._update_state(image, state, s_x, row[:4], row[4]))
+        return outs
+
+    def _update_state(self, image, state, s_x, bbox, best_score):
         bbox = bbox * s_x
-        cx = bbox[0] + self.center_pos[0] - s_x / 2
-        cy = bbox[1] + self.center_pos[1] - s_x / 2
+        cx = bbox[0] + state['center_pos'][0] - s_x / 2
+        cy = bbox[1] + state['center_pos'][1] - s_x / 2
         width = bbox[2]
         height = bbox[3]
 
@@ -178,8 +236,8 @@ class TransT(object):
                                                 height, image.shape[:2])
 
         # update state
-        self.center_pos = np.array([cx, cy])
-        self.size = np.array([width, height])
+        state['center_pos'] = np.array([cx, cy])
+        state['size'] = np.array([width, height])
 
         bbox = [cx - width / 2,
                 cy - height / 2,
@@ -187,5 +245,19 @@ class TransT(object):
                 height]
 
         out = {'target_bbox': bbox,
-               'best_score': pscore}
+               'best_score': best_score}
         return out
+
+
+def _select(template, i):
+    """take the i-th sample of a template (src, mask, pos), src and pos are sequence first"""
+    src, mask, pos = template
+    return src[:, i:i + 1], mask[i:i + 1], pos[:, i:i + 1]
+
+
+def _cat_templates(templates):
+    """stack per sequence templates into one batch"""
+    if len(templates) == 1:
+        return templates[0]
+    src, mask, pos = zip(*templates)
+    return torch.cat(src, 1), torch.cat(mask), torch.cat(pos, 1)
@@ -1,17 +1,38 @@
 import numpy as np
+import torch
 
 from tracker import TrackerBase
 from .net_wrappers import NetWithBackbone
 from .tracker import TransT
 
 class TrackerTransT(TrackerBase):
-    def __init__(self, net_path):
-        net = NetWithBackbone(net_path=net_path, use_gpu=True)
-        self.tracker = TransT(name='transt', net=net, window_penalty=0.49, exemplar_size=128, instance_size=256)
+    """
+    Args:
+        net_path (str): checkpoint path
+        int8 (bool): use the int8 network saved by calibrate.py as [net_path].int8.pt,
+            runs on CPU, see quantize.py
+        device (str): device to run on, the GPU if available (and not int8) by default
+        fusion_layers (int): run only the first fusion_layers feature fusion layers (of 4), faster but less accurate
+        exit_score (float): stop after the first fusion layer whose best foreground probability reaches exit_score,
+            see `fusion_depth.py` for the speed/accuracy trade-off of both
+    """
+    def __init__(self, net_path, int8=False, device=None, fusion_layers=None, exit_score=None):
+        if device is None:
+            device = 'cuda' if torch.cuda.is_available() and not int8 else 'cpu'
+        net = NetWithBackbone(net_path=net_path, int8=int8, device=device)
+        self.tracker = TransT(name='transt', net=net, window_penalty=0.49, exemplar_size=128, instance_size=256,
+                              device=device, fusion_layers=fusion_layers, exit_score=exit_score)
     
     def init(self, img, bbox):
         self.tracker.initialize(img, {'init_bbox': bbox})
 
     def track(self, img):
         res = self.tracker.track(img, {})
-        return np.array(res['target_bbox'])
\ No newline at end of file
+        return np.array(res['target_bbox'])
+
+    def init_batch(self, imgs, bboxes, seq_ids=None):
+        self.tracker.initialize_batch(imgs, bboxes, seq_ids)
+
+    def track_batch(self, imgs, seq_ids=None):
+        res = self.tracker.track_batch(imgs, seq_ids)
+        return np.array([r['target_bbox'] for r in res])
\ No newline at end of file
@@ -7,7 +7,7 @@ Mostly copy-paste from torchvision references.
 import os
 import subprocess
 import time
-from collections import defaultdict, deque
+from collections import defaultdict, deque, OrderedDict
 import datetime
 import pickle
 from typing import Optional, List
@@ -299,24 +299,50 @@ def nested_tensor_from_tensor(tensor1: Tensor):
         raise ValueError('not supported')
     return NestedTensor(tensor, mask)
 
+class TensorCache(object):
+    """Bounded LRU cache of tensors that only depend on a hashable key,
+    e.g. (shape, dtype, device). The cached tensors are shared and must not be modified in place.
+    """
+
+    def __init__(self, maxsize=16):
+        self.maxsize = maxsize
+        self.tensors = OrderedDict()
+
+    def get(self, key, build):
+        """the tensor cached for key, build() creates it on a miss"""
+        tensor = self.tensors.get(key)
+        if tensor is None:
+            tensor = build()
+            self.tensors[key] = tensor
+            if len(self.tensors) > self.maxsize:
+                self.tensors.popitem(last=False)
+        else:
+            self.tensors.move_to_end(key)
+        return tensor
+
+    def contains(self, key, tensor):
+        return self.tensors.get(key) is tensor
+
+
+_zero_masks = TensorCache()
+
+def zero_mask(shape, device):
+    """shared all-False (nothing padded) mask"""
+    shape = tuple(shape)
+    return _zero_masks.get((shape, device), lambda: torch.zeros(shape, dtype=torch.bool, device=device))
+
+def is_zero_mask(mask: Tensor):
+    """whether mask is a shared mask from `zero_mask`, cheaper than checking its values"""
+    return _zero_masks.contains((tuple(mask.shape), mask.device), mask)
+
 def nested_tensor_from_tensor_2(tensor1: Tensor):
-    # TODO make this more general
+    # images of a batch tensor have the same size, so nothing is padded
     if tensor1[0].ndim == 3:
-        # TODO make it support different-sized images
-        max_size = _max_by_axis([list(img.shape) for img in tensor1])
-        # min_size = tuple(min(s) for s in zip(*[img.shape for img in tensor_list]))
-        batch_shape = [len(tensor1)] + max_size
-        b, c, h, w = batch_shape
-        dtype = tensor1.dtype
-        device = tensor1.device
-        tensor = torch.zeros(batch_shape, dtype=dtype, device=device)
-        mask = torch.ones((b, h, w), dtype=torch.bool, device=device)
-        for img, pad_img, m in zip(tensor1, tensor, mask):
-            pad_img[: img.shape[0], : img.shape[1], : img.shape[2]].copy_(img)
-            m[: img.shape[1], :img.shape[2]] = False
+        b, c, h, w = tensor1.shape
+        mask = zero_mask((b, h, w), tensor1.device)
     else:
         raise ValueError('not supported')
-    return NestedTensor(tensor, mask)
+    return NestedTensor(tensor1, mask)
 
 def nested_tensor_from_tensor_list(tensor_list: List[Tensor]):
     # TODO make this more general
@@ -1,22 +1,58 @@
 import cv2
 import numpy as np
+import queue
+import sys
+import threading
 
-def show_img(img, bbox=None, win_name='frame'):
-    """display image and draw bounding box
+def draw_bbox(img, bbox=None, out=None):
+    """draw bounding box on a copy of image
 
     Args:
         img (ndarray): HxWxC, in BGR
         bbox (ndarray): (4,)
+        out (ndarray): buffer with the same shape as img to draw into, 
+            a new copy is allocated if None
     """
-    img_dis = img.copy()
+    if out is None:
+        out = img.copy()
+    else:
+        np.copyto(out, img)
     if bbox is not None:
         bbox = bbox.astype(np.int32)
-        cv2.rectangle(img_dis, bbox[:2], bbox[:2] + bbox[2:], (0, 0, 255), 2)
-    cv2.imshow(win_name, img_dis)
-    cv2.waitKey(1)
+        cv2.rectangle(out, bbox[:2], bbox[:2] + bbox[2:], (0, 0, 255), 2)
+    return out
+
+def show_img(img, bbox=None, win_name='frame', out=None, display=True):
+    """display image and draw bounding box
+
+    Args:
+        img (ndarray): HxWxC, in BGR
+        bbox (ndarray): (4,)
+        out (ndarray): buffer to draw into, see `draw_bbox`
+        display (bool): whether to call cv2.imshow
+    """
+    img_dis = draw_bbox(img, bbox, out)
+    if display:
+        cv2.imshow(win_name, img_dis)
+        cv2.waitKey(1)
 
     return img_dis
 
+def bbox_iou(a, b):
+    """IoU of bounding boxes
+
+    Args:
+        a, b (ndarray): (..., 4), [xmin, ymin, w, h]
+    Returns:
+        (ndarray): (...,)
+    """
+    a, b = np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64)
+    tl = np.maximum(a[..., :2], b[..., :2])
+    br = np.minimum(a[..., :2] + a[..., 2:], b[..., :2] + b[..., 2:])
+    inter = np.prod(np.clip(br - tl, 0, None), axis=-1)
+    union = np.prod(a[..., 2:], axis=-1) + np.prod(b[..., 2:], axis=-1) - inter
+    return inter / np.maximum(union, 1e-12)
+
 def make_video(imgs, video_name):
     fourcc = cv2.VideoWriter_fourcc(*'mp4v')
     fps = 15
@@ -25,4 +61,122 @@ def make_video(imgs, video_name):
     for img in imgs:
         # img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
         video_writer.write(img)
-    video_writer.release()
\ No newline at end of file
+    video_writer.release()
+
+
+class VideoRecorder(object):
+    """write frames to a video file as they arrive, instead of buffering them
+
+    Args:
+        video_name (str): output file
+        fps (int): frame rate of the video
+        frame_skip (int): only keep one frame out of every `frame_skip`
+        scale (float): resize factor applied to the kept frames
+        threaded (bool): encode in a background thread
+        queue_size (int): max frames waiting for the encoding thread
+    """
+    def __init__(self, video_name, fps=15, frame_skip=1, scale=1.0,
+                 threaded=False, queue_size=64):
+        self.video_name = video_name
+        self.fps = fps
+        self.frame_skip = max(1, frame_skip)
+        self.scale = scale
+        self.video_writer = None
+        self.frame_cnt = 0
+        self.queue = None
+        self.thread = None
+        self.error = None
+        if threaded:
+            self.queue = queue.Queue(maxsize=queue_size)
+            self.thread = threading.Thread(target=self._encode_loop, daemon=True)
+            self.thread.start()
+
+    def write(self, img):
+        """
+        Args:
+            img (ndarray): HxWxC, in BGR; the caller may reuse it afterwards
+        """
+        self.frame_cnt += 1
+        if (self.frame_cnt - 1) % self.frame_skip != 0:
+            return
+        if self.scale != 1.0:
+            img = cv2.resize(img, None, fx=self.scale, fy=self.scale,
+                             interpolation=cv2.INTER_AREA)
+        elif self.queue is not None:
+            img = img.copy()
+        if self.queue is not None:
+            self.queue.put(img)
+        else:
+            self._write(img)
+
+    def close(self):
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+        if self.video_writer is not None:
+            self.video_writer.release()
+            self.video_writer = None
+        if self.error is not None:
+            error, self.error = self.error, None
+            if sys.exc_info()[1] is not None:
+                # called from a finally, do not hide the tracker or env error unwinding through it
+                print(f"Video encoding of {self.video_name} failed: {error!r}")
+            else:
+                raise error
+
+    def _write(self, img):
+        if self.video_writer is None:
+            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+            height, width = img.shape[:2]
+            self.video_writer = cv2.VideoWriter(self.video_name, fourcc,
+                self.fps, (width, height))
+        self.video_writer.write(img)
+
+    def _encode_loop(self):
+        while True:
+            img = self.queue.get()
+            if img is None:
+                break
+            if self.error is not None:
+                continue  # keep draining so that write() never blocks
+            try:
+                self._write(img)
+            except Exception as e:
+                self.error = e
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class FrameViewer(object):
+    """display and/or record annotated frames
+
+    Frames are annotated in a reused buffer, and nothing is drawn at all when
+    there is neither a display nor a recorder (headless evaluation).
+
+    Args:
+        display (bool): whether to show frames with cv2.imshow
+        recorder (VideoRecorder): where to write frames, or None
+    """
+    def __init__(self, display=True, recorder=None):
+        self.display = display
+        self.recorder = recorder
+        self.buffer = None
+
+    def show(self, img, bbox=None, win_name='frame', record=True):
+        if not self.display and self.recorder is None:
+            return None
+        if self.buffer is None or self.buffer.shape != img.shape:
+            self.buffer = np.empty_like(img)
+        img_dis = show_img(img, bbox, win_name, self.buffer, self.display)
+        if record and self.recorder is not None:
+            self.recorder.write(img_dis)
+        return img_dis
+
+    def close(self):
+        if self.recorder is not None:
+            self.recorder.close()